@@ -0,0 +1,216 @@
+from igl import (CheckersGame, DRAW_PLIES, REPETITIONS, MAN_VALUE,
+                 KING_VALUE)
+from bitboard import BitBoard, iter_bits
+from records import RESULT_NONE, RESULT_P1, RESULT_P2, RESULT_DRAW
+import numpy as np
+
+# Square codes of a batch grid, positive for player 1 and negative for
+# player 2. Grids are padded by two squares of OFF_BOARD on every side while
+# moves are computed, so neighbours never fall outside the array.
+EMPTY = 0
+MAN = 1
+KING = 2
+OFF_BOARD = 100
+
+# (row step, column step) of the four diagonal directions, in the order of
+# the direction axis of move_masks and jump_masks
+DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+class GameBatch:
+    """
+    K game states of one board size held as a stacked int8 array, so counts,
+    evaluations, move masks and results are computed for every state at once
+    with NumPy instead of one CheckersGame at a time
+    """
+    def __init__(self, grids, turns):
+        """
+        Constructor
+
+        Args:
+            grids (ndarray): K x rows x cols int8 array of square codes,
+            player 1 pieces positive (MAN or KING) and player 2 negative
+            turns (ndarray): turn count of every state, player 1 moves on odd
+            turns as in CheckersGame
+
+        Attributes:
+            self.sign = 1 where player 1 is to move, -1 where player 2 is
+        Returns: None
+        """
+        self.grids = np.asarray(grids, dtype = np.int8)
+        self.turns = np.asarray(turns, dtype = np.int64)
+        self.sign = np.where(self.turns % 2 == 1, 1, -1).astype(np.int8)
+
+    def __len__(self):
+        return len(self.grids)
+
+    @classmethod
+    def from_games(cls, games):
+        """
+        Stacks the states of some games of one board size
+
+        Input:
+            games (list[CheckersGame]): games to copy
+
+        Returns: GameBatch
+        """
+        bits = games[0].board.bits
+        squares, rows, cols = _squares(bits)
+        nbytes = _nbytes(bits)
+        grids = np.zeros((len(games), bits.nrows, bits.ncols), dtype = np.int8)
+        for k, game in enumerate(games):
+            b = game.board.bits
+            p1 = _unpack(b.p1, nbytes, squares)
+            p2 = _unpack(b.p2, nbytes, squares)
+            kings = _unpack(b.kings, nbytes, squares)
+            grids[k, rows, cols] = (p1.astype(np.int8) - p2) * (1 + kings)
+        return cls(grids, [game.turn for game in games])
+
+    def to_game(self, k):
+        """
+        Builds a CheckersGame holding one state of the batch
+
+        Input:
+            k (int): index of the state
+
+        Returns: CheckersGame
+        """
+        nrows, ncols = self.grids.shape[1:]
+        bits = BitBoard(nrows, ncols)
+        squares, rows, cols = _squares(bits)
+        nbytes = _nbytes(bits)
+        codes = self.grids[k, rows, cols]
+        p1 = _pack(codes > 0, nbytes, squares)
+        p2 = _pack(codes < 0, nbytes, squares)
+        kings = _pack(np.abs(codes) == KING, nbytes, squares)
+        return CheckersGame.from_snapshot(((nrows - 2) // 2, p1, p2, kings,
+                                           int(self.turns[k]), DRAW_PLIES,
+                                           REPETITIONS))
+
+    def to_games(self):
+        return [self.to_game(k) for k in range(len(self))]
+
+    def counts(self):
+        """
+        Counts the men and kings of both players in every state
+
+        Returns: K x 4 array of (player 1 men, player 1 kings, player 2 men,
+        player 2 kings)
+        """
+        grids = self.grids
+        return np.stack([(grids == code).sum((1, 2))
+                         for code in (MAN, KING, -MAN, -KING)], axis = 1)
+
+    def evaluate(self):
+        """
+        Material evaluation of every state for the player to move, the same
+        score as engine.evaluate
+
+        Returns: ndarray of K ints
+        """
+        values = np.array([0, MAN_VALUE, KING_VALUE], dtype = np.int64)
+        grids = self.grids
+        material = (np.sign(grids) * values[np.abs(grids)]).sum((1, 2))
+        return material * self.sign
+
+    def _masks(self, sign):
+        """
+        Computes simple move and first jump masks for the given side of every
+        state
+
+        Input:
+            sign (ndarray): 1 or -1 per state, the side to compute for
+
+        Returns: tuple of two K x 4 x rows x cols bool arrays
+        """
+        grids = self.grids
+        k, nrows, ncols = grids.shape
+        padded = np.full((k, nrows + 4, ncols + 4), OFF_BOARD, dtype = np.int8)
+        padded[:, 2:-2, 2:-2] = grids
+        relative = grids * sign[:, None, None]
+        own = relative > 0
+        kings = relative == KING
+        # player 1's men move up the board (towards row 0)
+        forward = -sign
+        moves = np.zeros((k, 4, nrows, ncols), dtype = bool)
+        jumps = np.zeros((k, 4, nrows, ncols), dtype = bool)
+        for d, (dr, dc) in enumerate(DIRECTIONS):
+            allowed = own & (kings | (forward == dr)[:, None, None])
+            step = padded[:, 2 + dr:2 + dr + nrows, 2 + dc:2 + dc + ncols]
+            land = padded[:, 2 + 2 * dr:2 + 2 * dr + nrows,
+                          2 + 2 * dc:2 + 2 * dc + ncols]
+            over = step * sign[:, None, None]
+            moves[:, d] = allowed & (step == EMPTY)
+            jumps[:, d] = (allowed & (over < 0) & (over >= -KING) &
+                           (land == EMPTY))
+        return moves, jumps
+
+    def move_masks(self):
+        """
+        Pieces of the player to move that can make a simple move, per
+        direction (see DIRECTIONS)
+
+        Returns: K x 4 x rows x cols bool array
+        """
+        return self._masks(self.sign)[0]
+
+    def jump_masks(self):
+        """
+        Pieces of the player to move that can start a jump, per direction
+        (see DIRECTIONS)
+
+        Returns: K x 4 x rows x cols bool array
+        """
+        return self._masks(self.sign)[1]
+
+    def can_move(self, sign = None):
+        """
+        Checks which states let a side move, the player to move by default
+
+        Input:
+            sign (None or ndarray): 1 or -1 per state
+
+        Returns: ndarray of K bools
+        """
+        if sign is None:
+            sign = self.sign
+        moves, jumps = self._masks(sign)
+        return moves.any((1, 2, 3)) | jumps.any((1, 2, 3))
+
+    def status(self):
+        """
+        Result of every state with the rules of CheckersGame: a draw when
+        neither player can move, a win for the player who just moved when
+        the player to move cannot. States carry no history, so draws by
+        repetition or by the move limit are not detected.
+
+        Returns: ndarray of K RESULT_ codes (see records.py)
+        """
+        current = self.can_move()
+        other = self.can_move(-self.sign)
+        waiting = np.where(self.sign == 1, RESULT_P2, RESULT_P1)
+        return np.where(current, RESULT_NONE,
+                        np.where(other, waiting, RESULT_DRAW)).astype(np.int8)
+
+def _squares(bits):
+    """
+    BitBoard index, row and column of every playable square of a board size
+
+    Returns: tuple of three ndarrays
+    """
+    squares = np.array(list(iter_bits(bits.valid)))
+    rows, cols = np.divmod(2 * squares + 1, bits.ncols + 1)
+    return squares, rows, cols
+
+def _nbytes(bits):
+    return (bits.nrows * (bits.ncols + 1) // 2 + 7) // 8
+
+def _unpack(mask, nbytes, squares):
+    flags = np.unpackbits(np.frombuffer(mask.to_bytes(nbytes, "little"),
+                          dtype = np.uint8), bitorder = "little")
+    return flags[squares]
+
+def _pack(flags, nbytes, squares):
+    bits = np.zeros(nbytes * 8, dtype = np.uint8)
+    bits[squares[flags]] = 1
+    return int.from_bytes(np.packbits(bits, bitorder = "little").tobytes(),
+                          "little")
@@ -0,0 +1,290 @@
+from igl import CheckersGame
+from bitboard import iter_bits
+from perft import perft
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+# Benchmarks of the rules engine. Every benchmark is run on several board
+# sizes and reports operations per second, so the JSON output of two runs
+# can be compared with --compare. Perft node counts are recorded alongside
+# the timings: a change to move generation that alters them is a bug, not
+# a speedup.
+
+MIDGAME_PLIES = 12
+PLAYOUT_PLIES = 300
+
+def _piece_locs(game):
+    """
+    Location of every piece of the current player
+
+    Returns: list[tuple]
+    """
+    bits = game.board.bits
+    player_num = game.get_curr_player().player_num
+    return [bits.loc(sq) for sq in iter_bits(bits.pieces(player_num))]
+
+def midgame(n, seed = 0):
+    """
+    Plays a few random plies from the starting position
+
+    Input:
+        n (int): number of rows of pieces per player
+        seed (int): seed of the random plies
+
+    Returns: CheckersGame
+    """
+    rng = random.Random(seed)
+    game = CheckersGame(n)
+    for _ in range(MIDGAME_PLIES):
+        moves = game.legal_moves()
+        if not moves:
+            break
+        game.play_move(rng.choice(moves))
+    return game
+
+def multijump(n, depth = 6):
+    """
+    Builds a position where one man of player 1 can chain up to depth jumps,
+    choosing between two landings at every jump. Player 2's men sit on every
+    other row in front of it with the rows between them left empty.
+
+    Input:
+        n (int): number of rows of pieces per player
+        depth (int): most jumps in one move, limited by the board size
+
+    Returns: CheckersGame
+    """
+    game = CheckersGame(n)
+    bits = game.board.bits
+    nrows, ncols = bits.nrows, bits.ncols
+    bits.p1 = bits.p2 = bits.kings = 0
+    start = bits.square((nrows - 1, 0))
+    bits.p1 = 1 << start
+    depth = min(depth, (nrows - 1) // 2)
+    for k in range(depth):
+        r = nrows - 2 - 2 * k
+        for c in range(ncols):
+            sq = bits.square((r, c))
+            if sq is not None:
+                bits.p2 |= 1 << sq
+    bits.hash = bits.compute_hash()
+    game.sync_counts()
+    game.reset_history()
+    return game
+
+def _time(fn, min_time):
+    """
+    Calls fn repeatedly for at least min_time seconds
+
+    Returns: tuple (number of calls, seconds)
+    """
+    calls = 0
+    batch = 1
+    clock = time.perf_counter
+    start = clock()
+    while True:
+        for _ in range(batch):
+            fn()
+        calls += batch
+        elapsed = clock() - start
+        if elapsed >= min_time:
+            return calls, elapsed
+        batch *= 2
+
+def _bench_moves(game):
+    locs = _piece_locs(game)
+    def run():
+        for loc in locs:
+            game.get_possible_moves(loc)
+    return run
+
+def _bench_jumps(game):
+    locs = _piece_locs(game)
+    def run():
+        for loc in locs:
+            game.get_possible_jumps(loc)
+    return run
+
+def _bench_legal_moves(game):
+    return game.legal_moves
+
+def _bench_can_move_any(game):
+    return game._can_move_any
+
+def _bench_end_turn(game):
+    # a piece that is not on its king row, so the board is left unchanged.
+    # The draw history end_turn adds to is restarted as well, otherwise
+    # every call after the second would be a draw by repetition and the
+    # history would keep growing; restarting it only hashes the position.
+    player = game.get_curr_player()
+    loc = next(loc for loc in _piece_locs(game) if loc[0] != player.king_row)
+    def run():
+        game.end_turn(loc)
+        game.turn -= 1
+        game.reset_history()
+    return run
+
+def _bench_view(game):
+    # forces the object board to be rebuilt from the BitBoard, as it is
+    # after every move, and takes player 2's rotated view of it
+    board = game.board
+    player = game.player2
+    def run():
+        board._view_state = None
+        board.view(player)
+    return run
+
+def _bench_playout(n, seed):
+    rng = random.Random(seed)
+    def run():
+        game = CheckersGame(n)
+        for _ in range(PLAYOUT_PLIES):
+            moves = game.legal_moves()
+            if not moves or game.play_move(rng.choice(moves)):
+                break
+    return run
+
+# (benchmark name, position name, builder of the function to time)
+BENCHMARKS = [
+    ("get_possible_moves", "start", _bench_moves),
+    ("get_possible_moves", "midgame", _bench_moves),
+    ("get_possible_jumps", "midgame", _bench_jumps),
+    ("get_possible_jumps", "multijump", _bench_jumps),
+    ("legal_moves", "midgame", _bench_legal_moves),
+    ("legal_moves", "multijump", _bench_legal_moves),
+    ("_can_move_any", "midgame", _bench_can_move_any),
+    ("end_turn", "midgame", _bench_end_turn),
+    ("view", "midgame", _bench_view),
+]
+
+POSITIONS = {"start": CheckersGame, "midgame": midgame, "multijump": multijump}
+
+def run(sizes, min_time = 0.2, perft_depth = 4, seed = 0, only = None):
+    """
+    Runs every benchmark on every board size
+
+    Input:
+        sizes (list[int]): numbers of rows of pieces per player
+        min_time (float): seconds each benchmark runs for at least
+        perft_depth (int): depth of the perft node counts
+        seed (int): seed of the random positions and playouts
+        only (None or list[str]): names of the benchmarks to run
+
+    Returns: dict with the results and a description of the machine
+    """
+    results = []
+    for n in sizes:
+        for name, position, build in BENCHMARKS:
+            if only and name not in only:
+                continue
+            fn = build(POSITIONS[position](n))
+            calls, elapsed = _time(fn, min_time)
+            results.append({"name": name, "position": position, "nrows": n,
+                            "calls": calls, "ops_per_sec": calls / elapsed})
+        if not only or "playout" in only:
+            calls, elapsed = _time(_bench_playout(n, seed), min_time)
+            results.append({"name": "playout", "position": "start",
+                            "nrows": n, "calls": calls,
+                            "ops_per_sec": calls / elapsed})
+
+    counts = []
+    if perft_depth:
+        for n in sizes:
+            for position in ("start", "midgame"):
+                game = POSITIONS[position](n)
+                start = time.perf_counter()
+                nodes = perft(game, perft_depth)
+                elapsed = time.perf_counter() - start
+                counts.append({"position": position, "nrows": n,
+                               "depth": perft_depth, "nodes": nodes,
+                               "nodes_per_sec": nodes / elapsed})
+
+    return {"machine": {"python": platform.python_version(),
+                        "implementation": platform.python_implementation(),
+                        "platform": platform.platform()},
+            "min_time": min_time, "results": results, "perft": counts}
+
+def _key(entry):
+    return (entry["name"], entry["position"], entry["nrows"])
+
+def compare(old, new, threshold = 0.1):
+    """
+    Compares two benchmark runs
+
+    Input:
+        old (dict): results of the reference run
+        new (dict): results of the run to check
+        threshold (float): slowdown ratio reported as a regression
+
+    Returns: tuple (list[str] report lines, bool True if the new run has a
+    regression or a perft count that differs)
+    """
+    lines = []
+    failed = False
+    old_results = {_key(entry): entry for entry in old["results"]}
+    for entry in new["results"]:
+        ref = old_results.get(_key(entry))
+        if ref is None:
+            continue
+        ratio = entry["ops_per_sec"] / ref["ops_per_sec"]
+        flag = ""
+        if ratio < 1 - threshold:
+            flag = "  REGRESSION"
+            failed = True
+        lines.append("{:<20} {:<10} n={:<3} {:>7.2f}x{}".format(
+            entry["name"], entry["position"], entry["nrows"], ratio, flag))
+
+    old_counts = {(c["position"], c["nrows"], c["depth"]): c["nodes"]
+                  for c in old["perft"]}
+    for count in new["perft"]:
+        nodes = old_counts.get((count["position"], count["nrows"],
+                                count["depth"]))
+        if nodes is not None and nodes != count["nodes"]:
+            lines.append("perft {} n={} depth {}: {} nodes, expected {}".format(
+                count["position"], count["nrows"], count["depth"],
+                count["nodes"], nodes))
+            failed = True
+    return lines, failed
+
+def _report(data):
+    for entry in data["results"]:
+        sys.stdout.write("{:<20} {:<10} n={:<3} {:>12.1f} ops/s\n".format(
+            entry["name"], entry["position"], entry["nrows"],
+            entry["ops_per_sec"]))
+    for count in data["perft"]:
+        sys.stdout.write("perft {:<14} {:<10} n={:<3} {:>12} nodes "
+                         "{:>10.0f} nodes/s\n".format(
+                         "depth {}".format(count["depth"]), count["position"],
+                         count["nrows"], count["nodes"],
+                         count["nodes_per_sec"]))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description =
+    "Benchmarks of the checkers rules engine")
+    parser.add_argument("-n", "--sizes", type = int, nargs = "+",
+                        default = [3, 5, 10, 20])
+    parser.add_argument("-t", "--min-time", type = float, default = 0.2)
+    parser.add_argument("-d", "--perft-depth", type = int, default = 4)
+    parser.add_argument("-s", "--seed", type = int, default = 0)
+    parser.add_argument("--only", type = str, nargs = "+")
+    parser.add_argument("-f", "--out", type = str)
+    parser.add_argument("-c", "--compare", type = str)
+    parser.add_argument("--threshold", type = float, default = 0.1)
+    args = parser.parse_args()
+
+    data = run(args.sizes, args.min_time, args.perft_depth, args.seed,
+               args.only)
+    _report(data)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(data, f, indent = 1)
+    if args.compare:
+        with open(args.compare) as f:
+            lines, failed = compare(json.load(f), data, args.threshold)
+        sys.stdout.write("\n".join(lines) + "\n")
+        if failed:
+            sys.exit(1)
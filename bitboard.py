@@ -0,0 +1,527 @@
+from collections import namedtuple
+from hashing import zobrist_keys
+
+Move = namedtuple("Move", ["path", "captures"])
+Move.__doc__ = """
+A move as BitBoard squares. path holds the square the piece starts on
+followed by every square it lands on, captures holds the square of every
+piece it jumps over (empty for a simple move).
+"""
+
+def iter_bits(mask):
+    """
+    Yields the index of every set bit in a mask, lowest first
+
+    Input:
+        mask (int): bitmask
+
+    Returns: generator[int]
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+# (row step, column step) of the four diagonal directions, in the order of
+# the per-direction entries of BoardGeometry
+DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+_geometry_cache = {}
+
+class BoardGeometry:
+    """
+    Lookup tables of the square layout of one board size, so rule checks
+    on locations find squares, neighbours and jumped squares with a lookup
+    instead of bounds and diagonal arithmetic. Tables are built the first
+    time a board of the size is made and shared by every later one.
+    """
+    def __init__(self, nrows, ncols):
+        """
+        Constructor
+
+        Args:
+            nrows (int): number of rows
+            ncols (int): number of columns
+
+        Attributes:
+            self.squares = BitBoard square of every playable location
+            self.locs = location of every square, None for guard squares
+            self.neighbors = per square, the neighbouring square in each of
+            DIRECTIONS or None off the board
+            self.step_rows = row step of every (square, neighbour) pair
+            self.jumped = jumped square of every (square, landing) pair
+        Returns: None
+        """
+        nsquares = (nrows * (ncols + 1)) // 2
+        self.squares = {}
+        self.locs = [None] * nsquares
+        for r in range(nrows):
+            for c in range((r + 1) % 2, ncols, 2):
+                sq = (r * (ncols + 1) + c) // 2
+                self.squares[(r, c)] = sq
+                self.locs[sq] = (r, c)
+        self.neighbors = [None] * nsquares
+        self.step_rows = {}
+        self.jumped = {}
+        for (r, c), sq in self.squares.items():
+            neighbors = []
+            for dr, dc in DIRECTIONS:
+                step = self.squares.get((r + dr, c + dc))
+                land = self.squares.get((r + 2 * dr, c + 2 * dc))
+                neighbors.append(step)
+                if step is not None:
+                    self.step_rows[(sq, step)] = dr
+                if land is not None:
+                    self.jumped[(sq, land)] = step
+            self.neighbors[sq] = tuple(neighbors)
+
+def board_geometry(nrows, ncols):
+    """
+    Returns the lookup tables for a board size, creating them on first use
+
+    Input:
+        nrows (int): number of rows
+        ncols (int): number of columns
+
+    Returns: BoardGeometry
+    """
+    geometry = _geometry_cache.get((nrows, ncols))
+    if geometry is None:
+        geometry = BoardGeometry(nrows, ncols)
+        _geometry_cache[(nrows, ncols)] = geometry
+    return geometry
+
+class BitBoard:
+    """
+    Compact game state storing the pieces of both players as integer masks
+    over the playable (dark) squares of the board.
+
+    A dark square (r, c) is stored at bit (r * (ncols + 1) + c) // 2. The
+    extra column acts as a guard so that diagonal neighbours are always a
+    fixed shift away and never wrap around an edge:
+        (r - 1, c - 1) -> bit - long      (r + 1, c + 1) -> bit + long
+        (r - 1, c + 1) -> bit - short     (r + 1, c - 1) -> bit + short
+    Python integers are unbounded, so any board size is supported.
+    """
+    def __init__(self, nrows, ncols):
+        """
+        Constructor
+
+        Args:
+            nrows (int): number of rows
+            ncols (int): number of columns (must be even)
+
+        Attributes:
+            self.nrows = number of rows
+            self.ncols = number of columns
+            self.short = bit shift to the (r - 1, c + 1) neighbour
+            self.long = bit shift to the (r - 1, c - 1) neighbour
+            self.valid = mask of every playable square
+            self.p1 = mask of player 1 pieces
+            self.p2 = mask of player 2 pieces
+            self.kings = mask of kinged pieces of either player
+            self.king_rows = mask of the row each player's men are kinged on
+            self.zobrist = Zobrist keys shared by every board of this size
+            self.hash = Zobrist hash of the pieces, updated on every change
+            self.geometry = lookup tables shared by every board of this size
+        Returns: None
+        """
+        if ncols % 2:
+            raise Exception("BitBoard needs an even number of columns")
+        self.nrows = nrows
+        self.ncols = ncols
+        self.short = ncols // 2
+        self.long = ncols // 2 + 1
+        self.valid = 0
+        self.p1 = 0
+        self.p2 = 0
+        self.kings = 0
+        self.king_rows = {1: 0, 2: 0}
+        forward = (-self.long, -self.short)
+        backward = (self.long, self.short)
+        self._directions = {1: (forward, forward + backward),
+                            2: (backward, backward + forward)}
+        self.zobrist = zobrist_keys(nrows, ncols)
+        self.geometry = board_geometry(nrows, ncols)
+        self._setup()
+        self.hash = self.compute_hash()
+
+    def _setup(self):
+        """
+        Places the starting pieces using the same layout as CheckerBoard
+
+        Returns: None
+        """
+        nrows = self.nrows
+        for r in range(nrows):
+            for c in range(self.ncols):
+                if (r + c) % 2 == 0:
+                    continue
+                bit = 1 << self.square((r, c))
+                self.valid |= bit
+                if r == 0:
+                    self.king_rows[1] |= bit
+                elif r == nrows - 1:
+                    self.king_rows[2] |= bit
+                if r >= (nrows / 2 + 1):
+                    self.p1 |= bit
+                elif r <= (nrows / 2 - 2):
+                    self.p2 |= bit
+
+    def square(self, loc):
+        """
+        Converts a location index into a bit index
+
+        Input:
+            loc (tuple): location index (row, column)
+
+        Returns: int or None if the location is not a playable square
+        """
+        r, c = loc
+        if r < 0 or c < 0 or r >= self.nrows or c >= self.ncols:
+            return None
+        if (r + c) % 2 == 0:
+            return None
+        return (r * (self.ncols + 1) + c) // 2
+
+    def loc(self, sq):
+        """
+        Converts a bit index back into a location index
+
+        Input:
+            sq (int): bit index
+
+        Returns: tuple[int]
+        """
+        return divmod(2 * sq + 1, self.ncols + 1)
+
+    def empty(self):
+        return self.valid & ~(self.p1 | self.p2)
+
+    def pieces(self, player_num):
+        return self.p1 if player_num == 1 else self.p2
+
+    def owner(self, sq):
+        """
+        Finds which player owns the piece on a square
+
+        Input:
+            sq (int): bit index
+
+        Returns: int (1 or 2, 0 for an empty square)
+        """
+        bit = 1 << sq
+        if self.p1 & bit:
+            return 1
+        if self.p2 & bit:
+            return 2
+        return 0
+
+    def is_king(self, sq):
+        return bool(self.kings >> sq & 1)
+
+    def _piece_key(self, sq):
+        """
+        Finds the Zobrist key of the piece on a square
+
+        Input:
+            sq (int): bit index of a piece
+
+        Returns: int
+        """
+        keys = self.zobrist.kings if self.kings >> sq & 1 else self.zobrist.men
+        return keys[self.owner(sq)][sq]
+
+    def compute_hash(self):
+        """
+        Computes the Zobrist hash of the pieces from scratch
+
+        Returns: int
+        """
+        h = 0
+        for sq in iter_bits(self.p1 | self.p2):
+            h ^= self._piece_key(sq)
+        return h
+
+    def move(self, src, dst):
+        """
+        Moves the piece on src to the empty square dst, keeping its rank
+
+        Input:
+            src (int): bit index of the piece
+            dst (int): bit index of the destination
+
+        Returns: None
+        """
+        self.hash ^= self._piece_key(src)
+        change = (1 << src) | (1 << dst)
+        if self.p1 >> src & 1:
+            self.p1 ^= change
+        else:
+            self.p2 ^= change
+        if self.kings >> src & 1:
+            self.kings ^= change
+        self.hash ^= self._piece_key(dst)
+
+    def remove(self, sq):
+        if self.owner(sq):
+            self.hash ^= self._piece_key(sq)
+        keep = ~(1 << sq)
+        self.p1 &= keep
+        self.p2 &= keep
+        self.kings &= keep
+
+    def king(self, sq):
+        self.hash ^= self._piece_key(sq)
+        self.kings |= 1 << sq
+        self.hash ^= self._piece_key(sq)
+
+    def apply(self, move, player_num):
+        """
+        Plays a move for a player, removing the captured pieces and kinging
+        a man that ends on its king row
+
+        Input:
+            move (Move): move to play
+            player_num (int): 1 or 2
+
+        Returns: tuple (captured kings mask, bool kinged, previous hash)
+        needed by undo
+        """
+        path = move.path
+        src = 1 << path[0]
+        dst = 1 << path[-1]
+        keys = self.zobrist
+        h = self.hash
+        captured = 0
+        if move.captures:
+            opponent = 3 - player_num
+            men_keys = keys.men[opponent]
+            king_keys = keys.kings[opponent]
+            for sq in move.captures:
+                captured |= 1 << sq
+                if self.kings >> sq & 1:
+                    h ^= king_keys[sq]
+                else:
+                    h ^= men_keys[sq]
+        captured_kings = self.kings & captured
+        if player_num == 1:
+            self.p1 = self.p1 & ~src | dst
+            self.p2 &= ~captured
+        else:
+            self.p2 = self.p2 & ~src | dst
+            self.p1 &= ~captured
+        kings = self.kings & ~captured
+        kinged = False
+        if kings & src:
+            kings = kings & ~src | dst
+            king_keys = keys.kings[player_num]
+            h ^= king_keys[path[0]] ^ king_keys[path[-1]]
+        elif dst & self.king_rows[player_num]:
+            kings |= dst
+            kinged = True
+            h ^= keys.men[player_num][path[0]] ^ keys.kings[player_num][path[-1]]
+        else:
+            men_keys = keys.men[player_num]
+            h ^= men_keys[path[0]] ^ men_keys[path[-1]]
+        self.kings = kings
+        token = (captured_kings, kinged, self.hash)
+        self.hash = h
+        return token
+
+    def undo(self, move, player_num, token):
+        """
+        Takes back a move played with apply
+
+        Input:
+            move (Move): move to take back
+            player_num (int): player who played the move
+            token (tuple): value returned by apply
+
+        Returns: None
+        """
+        captured_kings, kinged, self.hash = token
+        src = 1 << move.path[0]
+        dst = 1 << move.path[-1]
+        captured = 0
+        for sq in move.captures:
+            captured |= 1 << sq
+        if player_num == 1:
+            self.p1 = self.p1 & ~dst | src
+            self.p2 |= captured
+        else:
+            self.p2 = self.p2 & ~dst | src
+            self.p1 |= captured
+        kings = self.kings
+        if kinged:
+            kings &= ~dst
+        elif kings & dst:
+            kings = kings & ~dst | src
+        self.kings = kings | captured_kings
+
+    def count(self, player_num):
+        return self.pieces(player_num).bit_count()
+
+    def _steps(self, player_num):
+        """
+        Pairs every direction with the mask of the player's pieces allowed to
+        move along it. Backward directions are left out when the player has
+        no kings.
+
+        Input:
+            player_num (int): 1 or 2
+
+        Returns: list[tuple]
+        """
+        own = self.pieces(player_num)
+        forward, every = self._directions[player_num]
+        kings = own & self.kings
+        if not kings:
+            return [(d, own) for d in forward]
+        return [(d, own if d in forward else kings) for d in every]
+
+    def move_targets(self, player_num):
+        """
+        Computes, for every direction at once over the whole board, the mask
+        of empty squares a simple move can land on
+
+        Input:
+            player_num (int): 1 or 2
+
+        Returns: list[tuple] of (direction, landing mask)
+        """
+        empty = self.empty()
+        return [(d, (movers << d if d > 0 else movers >> -d) & empty)
+                for d, movers in self._steps(player_num)]
+
+    def jump_targets(self, player_num):
+        """
+        Computes, for every direction at once over the whole board, the mask
+        of empty squares a first jump can land on
+
+        Input:
+            player_num (int): 1 or 2
+
+        Returns: list[tuple] of (direction, landing mask)
+        """
+        empty = self.empty()
+        opponent = self.pieces(3 - player_num)
+        targets = []
+        for d, movers in self._steps(player_num):
+            if d > 0:
+                targets.append((d, ((movers << d) & opponent) << d & empty))
+            else:
+                targets.append((d, ((movers >> -d) & opponent) >> -d & empty))
+        return targets
+
+    def moves(self, player_num):
+        """
+        Lists every simple move of a player
+
+        Input:
+            player_num (int): 1 or 2
+
+        Returns: list[tuple] of (source square, destination square)
+        """
+        return [(dst - d, dst) for d, targets in self.move_targets(player_num)
+                for dst in iter_bits(targets)]
+
+    def jump_sequences(self, src, player_num, maximal = False):
+        """
+        Yields every jump sequence of the piece on a square. A piece may stop
+        after any of its jumps, so every prefix of a multi-jump is a move of
+        its own. The jumping piece's start square counts as empty while it
+        jumps, and the pieces it has captured stay on the board until the
+        move ends, so they cannot be jumped twice or landed on.
+
+        The capture tree is walked with an explicit stack. The path and
+        captures of the branch being walked live in two lists that are cut
+        back when the walk backtracks, so nothing but the yielded Moves is
+        allocated.
+
+        Input:
+            src (int): square of the jumping piece
+            player_num (int): 1 or 2
+            maximal (bool): only yield the sequences that cannot be
+            continued, leaving out the prefixes
+
+        Returns: generator[Move]
+        """
+        opponent = self.pieces(3 - player_num)
+        free = self.empty() | (1 << src)
+        forward, every = self._directions[player_num]
+        dirs = every if self.kings >> src & 1 else forward
+        path = [src]
+        captures = []
+        # (number of jumps made, landing square, captured square,
+        # mask of every captured square)
+        stack = []
+        at, depth, captured = src, 0, 0
+        while True:
+            nstack = len(stack)
+            for d in dirs:
+                mid = at + d
+                land = mid + d
+                if (land >= 0 and opponent >> mid & 1 and
+                not captured >> mid & 1 and free >> land & 1):
+                    stack.append((depth + 1, land, mid, captured | 1 << mid))
+            if maximal and depth and len(stack) == nstack:
+                yield Move(tuple(path), tuple(captures))
+            if not stack:
+                return
+            depth, at, mid, captured = stack.pop()
+            del path[depth:]
+            del captures[depth - 1:]
+            path.append(at)
+            captures.append(mid)
+            if not maximal:
+                yield Move(tuple(path), tuple(captures))
+
+    def jump_moves(self, player_num, maximal = False):
+        """
+        Lists every jump sequence of a player (see jump_sequences)
+
+        Input:
+            player_num (int): 1 or 2
+            maximal (bool): only list the sequences that cannot be continued
+
+        Returns: list[Move]
+        """
+        moves = []
+        sources = 0
+        for d, targets in self.jump_targets(player_num):
+            if targets:
+                sources |= targets >> 2 * d if d > 0 else targets << -2 * d
+        for src in iter_bits(sources):
+            moves.extend(self.jump_sequences(src, player_num, maximal))
+        return moves
+
+    def legal_moves(self, player_num):
+        """
+        Lists every move of a player, jumps first
+
+        Input:
+            player_num (int): 1 or 2
+
+        Returns: list[Move]
+        """
+        moves = self.jump_moves(player_num)
+        moves.extend(Move((src, dst), ()) for src, dst in self.moves(player_num))
+        return moves
+
+    def can_move(self, player_num):
+        """
+        Checks if a player has any simple move or jump
+
+        Input:
+            player_num (int): 1 or 2
+
+        Returns: bool
+        """
+        for _, targets in self.move_targets(player_num):
+            if targets:
+                return True
+        for _, targets in self.jump_targets(player_num):
+            if targets:
+                return True
+        return False
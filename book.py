@@ -0,0 +1,158 @@
+from igl import CheckersGame
+from records import draw_rules, read_games, RESULT_DRAW, RESULT_NONE
+import argparse
+import numpy as np
+import struct
+
+MAGIC = b"CKBK"
+VERSION = 1
+HEADER_SIZE = 32
+_HEADER = struct.Struct("<4sBHHQ")
+
+# Opening book layout: a 32 byte header (magic "CKBK", version (u8), nrows
+# (u16), ncols (u16), number of entries (u64), zero padding) followed by
+# fixed-width ENTRY records sorted by position hash. Every entry is one
+# move played from a position: the position hash (with the side to move,
+# see CheckersGame.position_hash), the hash of the position the move leads
+# to, and the results of the games it was played in for the player who
+# made it. Storing the resulting position rather than the move itself keeps
+# entries valid whatever order moves are generated in.
+ENTRY = np.dtype([("hash", "<u8"), ("child", "<u8"), ("games", "<u4"),
+                  ("wins", "<u4"), ("draws", "<u4"), ("losses", "<u4")])
+
+def build_book(archives, out_path, max_plies = 20):
+    """
+    Builds a book from the first plies of every finished game of some game
+    archives (see records.py). Games without a result are left out.
+
+    Input:
+        archives (list[str]): game archives of one board size
+        out_path (str): book file to create
+        max_plies (int): plies of each game added to the book
+
+    Returns: int number of entries written
+    """
+    counts = {}
+    size = None
+    for path in archives:
+        with open(path, "rb") as f:
+            for record in read_games(f):
+                if size is None:
+                    size = (record.nrows, record.ncols)
+                elif size != (record.nrows, record.ncols):
+                    raise Exception("Archives of different board sizes")
+                if record.result == RESULT_NONE:
+                    continue
+                game = CheckersGame((record.nrows - 2) // 2,
+                                    *draw_rules(record))
+                for move in record.moves[:max_plies]:
+                    player_num = game.get_curr_player().player_num
+                    key = game.position_hash()
+                    game.make_move(move)
+                    stats = counts.setdefault((key, game.position_hash()),
+                                              [0, 0, 0, 0])
+                    stats[0] += 1
+                    if record.result == RESULT_DRAW:
+                        stats[2] += 1
+                    elif record.result == player_num:
+                        stats[1] += 1
+                    else:
+                        stats[3] += 1
+
+    entries = np.array([key + tuple(stats) for key, stats
+                        in sorted(counts.items())], dtype = ENTRY)
+    nrows, ncols = size or (0, 0)
+    with open(out_path, "wb") as f:
+        header = _HEADER.pack(MAGIC, VERSION, nrows, ncols, len(entries))
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(entries.tobytes())
+    return len(entries)
+
+class OpeningBook:
+    """
+    Read-only opening book. The file is memory-mapped and searched with a
+    binary search on the position hash, so only the pages holding the
+    looked up entries are ever read.
+    """
+    def __init__(self, path, min_games = 2):
+        """
+        Constructor
+
+        Args:
+            path (str): book file written by build_book
+            min_games (int): moves played in fewer games are ignored
+
+        Returns: None
+        """
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+        magic, version, self.nrows, self.ncols, count = \
+            _HEADER.unpack_from(header)
+        if magic != MAGIC or version != VERSION:
+            raise Exception("Not an opening book")
+        self.min_games = min_games
+        if count == 0:
+            self.entries = np.zeros(0, dtype = ENTRY)
+        else:
+            self.entries = np.memmap(path, dtype = ENTRY, mode = "r",
+                                     offset = HEADER_SIZE, shape = (count,))
+
+    def lookup(self, game):
+        """
+        Finds the book moves of the current position
+
+        Input:
+            game (CheckersGame): game to look up
+
+        Returns: list[tuple] of (Move, book entry)
+        """
+        bits = game.board.bits
+        if (bits.nrows, bits.ncols) != (self.nrows, self.ncols):
+            return []
+        key = np.uint64(game.position_hash())
+        hashes = self.entries["hash"]
+        lo = int(np.searchsorted(hashes, key, "left"))
+        hi = int(np.searchsorted(hashes, key, "right"))
+        if lo == hi:
+            return []
+        entries = {int(entry["child"]): entry for entry in self.entries[lo:hi]}
+        found = []
+        for move in game.legal_moves():
+            game.make_move(move)
+            entry = entries.get(game.position_hash())
+            game.unmake_move()
+            if entry is not None:
+                found.append((move, entry))
+        return found
+
+    def choose(self, game):
+        """
+        Picks the book move with the best average result, preferring the
+        most played move on ties
+
+        Input:
+            game (CheckersGame): game to move in
+
+        Returns: Move or None if the position is not in the book
+        """
+        best = None
+        best_key = None
+        for move, entry in self.lookup(game):
+            games = int(entry["games"])
+            if games < self.min_games:
+                continue
+            score = (int(entry["wins"]) + int(entry["draws"]) / 2) / games
+            if best_key is None or (score, games) > best_key:
+                best = move
+                best_key = (score, games)
+        return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description =
+    "Build an opening book from game archives")
+    parser.add_argument("out", type = str)
+    parser.add_argument("archives", type = str, nargs = "+")
+    parser.add_argument("-p", "--plies", type = int, default = 20)
+    args = parser.parse_args()
+    print("{} entries written".format(build_book(args.archives, args.out,
+                                                 args.plies)))
@@ -1,20 +1,128 @@
-from tui import TUI
+from tui import TUI, OnlineTUI, script_input
+from igl import CheckersGame, DRAW_PLIES, REPETITIONS
+from perft import divide
+from records import from_pdn
+from replay import read_records, replay_game
+from server import serve, DEFAULT_HOST, DEFAULT_PORT
+from contextlib import nullcontext
 import argparse
+import builtins
+import sys
+import time
 
-def start(online, nrows, gamedisplay, **kwargs):
-    if online == 1:
-        raise NotImplementedError("Online Functionality not implemented")
+def start(online, nrows, gamedisplay, ai, thinktime, book, host, port, join,
+          render, input, replay, stdin_moves, engine, draw_plies, repetitions,
+          **kwargs):
+    if replay or stdin_moves:
+        run_replay(nrows, replay, stdin_moves, draw_plies, repetitions)
+        return
+    input_source = script_input(open(input)) if input else builtins.input
     if gamedisplay == "tui":
         if online == 0:
-            game = TUI(2, nrows)
+            game = TUI(2, nrows, ai, thinktime, book, render, input_source,
+                       engine, draw_plies, repetitions)
+            game.play()
+        else:
+            game = OnlineTUI(nrows, host, port, join, render, input_source)
             game.play()
     else:
         raise Exception("Invalid argument")
 
+def run_perft(nrows, depth, moves, workers, full, **kwargs):
+    game = CheckersGame(nrows)
+    if moves:
+        size = 2 * nrows + 2
+        record = from_pdn('[BoardSize "{0}x{0}"]\n{1}'.format(size, moves))
+        for i, move in enumerate(record.moves):
+            legal = [m for m in game.legal_moves() if m.path == move.path]
+            if not legal:
+                sys.stderr.write("move {} ({}) is illegal\n".format(i + 1,
+                                 game.describe_move(move)))
+                sys.exit(1)
+            game.make_move(legal[0])
+    start_time = time.perf_counter()
+    counts = divide(game, depth, not full, workers)
+    elapsed = time.perf_counter() - start_time
+    for move, nodes in counts:
+        sys.stdout.write("{}: {}\n".format(game.describe_move(move), nodes))
+    total = sum(nodes for _, nodes in counts)
+    sys.stdout.write("\nnodes: {} time: {:.2f}s nodes/s: {:.0f}\n".format(
+        total, elapsed, total / elapsed if elapsed else 0))
+
+def run_replay(nrows, replay, stdin_moves, draw_plies, repetitions,
+               **kwargs):
+    times = []
+    errors = 0
+    start_time = time.perf_counter()
+    with (nullcontext(sys.stdin.buffer) if stdin_moves
+          else open(replay, "rb")) as f:
+        for i, record in enumerate(read_records(f, nrows)):
+            state = replay_game(record, times, draw_plies, repetitions)
+            sys.stdout.write("game {}: plies {plies} turn {turn} result "
+                             "{result} p1 {p1} p2 {p2} hash {hash:016x}"
+                             .format(i, **state))
+            if state["error"]:
+                errors += 1
+                sys.stdout.write(" error: {}".format(state["error"]))
+            sys.stdout.write("\n")
+    elapsed = time.perf_counter() - start_time
+    times.sort()
+    if times:
+        sys.stdout.write("\nmoves: {} time: {:.2f}s moves/s: {:.0f}\n"
+                         "per move mean: {:.1f}us p50: {:.1f}us p99: {:.1f}us "
+                         "max: {:.1f}us\n".format(len(times), elapsed,
+                         len(times) / elapsed, 1e6 * sum(times) / len(times),
+                         1e6 * times[len(times) // 2],
+                         1e6 * times[min(len(times) - 1,
+                                         int(0.99 * len(times)))],
+                         1e6 * times[-1]))
+    sys.stdout.write("games with errors: {}\n".format(errors))
+    if errors:
+        sys.exit(1)
+
+def run_server(host, port, **kwargs):
+    sys.stdout.write("serving on {}:{}\n".format(host, port))
+    serve(host, port)
+
 parser = argparse.ArgumentParser(description='Let\'s play checkers')
 parser.set_defaults(method = start)
 parser.add_argument("-o", "--online", type = int, choices = [0,1], default = 0)
 parser.add_argument("-n", "--nrows", type = int, default = 3)
 parser.add_argument("-g", "--gamedisplay", type = str, default = "tui")
+parser.add_argument("-a", "--ai", type = int, choices = [0,1,2], default = 0)
+parser.add_argument("-t", "--thinktime", type = float, default = 1.0)
+parser.add_argument("-b", "--book", type = str, default = None)
+parser.add_argument("-e", "--engine", type = str, choices = ["search", "mcts"],
+                    default = "search")
+parser.add_argument("-H", "--host", type = str, default = DEFAULT_HOST)
+parser.add_argument("-p", "--port", type = int, default = DEFAULT_PORT)
+parser.add_argument("-j", "--join", type = int, default = None)
+parser.add_argument("-r", "--render", type = str, choices = ["full", "diff"],
+                    default = "full")
+parser.add_argument("-i", "--input", type = str, default = None)
+parser.add_argument("--draw-plies", type = int, default = DRAW_PLIES)
+parser.add_argument("--repetitions", type = int, default = REPETITIONS)
+parser.add_argument("--replay", type = str, default = None)
+parser.add_argument("--stdin-moves", action = "store_true")
+
+subparsers = parser.add_subparsers(title = "commands")
+perft_parser = subparsers.add_parser("perft",
+help = "count the leaf nodes of the move tree below every root move")
+perft_parser.set_defaults(method = run_perft)
+perft_parser.add_argument("-d", "--depth", type = int, default = 6)
+perft_parser.add_argument("-m", "--moves", type = str, default = "",
+help = "PDN moves played before counting, e.g. \"11-15 23-19\"")
+perft_parser.add_argument("-w", "--workers", type = int, default = 1)
+perft_parser.add_argument("--full", action = "store_true",
+help = "play every move of the last ply instead of counting them")
+
+serve_parser = subparsers.add_parser("serve",
+help = "host online games for --online 1 clients")
+serve_parser.set_defaults(method = run_server)
+serve_parser.add_argument("-H", "--host", type = str,
+                          default = argparse.SUPPRESS)
+serve_parser.add_argument("-p", "--port", type = int,
+                          default = argparse.SUPPRESS)
+
 args = parser.parse_args()
 args.method(**vars(args))
@@ -0,0 +1,211 @@
+from igl import CheckersGame, DRAW_PLIES, REPETITIONS
+from records import draw_rules, read_games, RESULT_P1, RESULT_P2
+import argparse
+import numpy as np
+import struct
+
+MAGIC = b"CKPS"
+VERSION = 1
+HEADER_SIZE = 64
+_HEADER = struct.Struct("<4sBHHBQ")
+_WORD_MASK = (1 << 64) - 1
+
+# Position dataset layout: a 64 byte header (magic "CKPS", version (u8),
+# nrows (u16), ncols (u16), words per mask (u8), number of records (u64),
+# zero padding) followed by fixed-width records of position_dtype. The
+# records can be mapped straight into a numpy array.
+
+def mask_words(nrows, ncols):
+    """
+    Number of 64 bit words needed to hold a BitBoard mask of a board size
+
+    Returns: int
+    """
+    nbits = nrows * (ncols + 1) // 2
+    return (nbits + 63) // 64
+
+def position_dtype(nwords):
+    """
+    Builds the record type of a dataset. Masks are stored as little endian
+    64 bit words, lowest word first. side is the player to move (1 or 2),
+    result is the game outcome for that player (1 win, 0 draw or
+    unfinished, -1 loss) and move_from/move_to/move_captures describe the
+    move that was played.
+
+    Input:
+        nwords (int): words per mask
+
+    Returns: numpy.dtype
+    """
+    mask = ("<u8", (nwords,))
+    return np.dtype([("p1_men",) + mask, ("p1_kings",) + mask,
+                     ("p2_men",) + mask, ("p2_kings",) + mask,
+                     ("side", "u1"), ("result", "i1"),
+                     ("move_from", "<u2"), ("move_to", "<u2"),
+                     ("move_captures", "u1")])
+
+def _split(mask, nwords):
+    return [(mask >> (64 * i)) & _WORD_MASK for i in range(nwords)]
+
+def join_words(words):
+    """
+    Turns the stored words of a mask back into a BitBoard mask
+
+    Input:
+        words (ndarray): words of one mask
+
+    Returns: int
+    """
+    mask = 0
+    for i, word in enumerate(words):
+        mask |= int(word) << (64 * i)
+    return mask
+
+class PositionWriter:
+    """
+    Streams positions into a dataset file, buffering records in blocks so
+    datasets larger than memory can be written
+    """
+    def __init__(self, path, nrows, ncols, block = 4096):
+        """
+        Constructor
+
+        Args:
+            path (str): file to create
+            nrows (int): number of rows of the board
+            ncols (int): number of columns of the board
+            block (int): number of records buffered before a write
+
+        Returns: None
+        """
+        self.nrows = nrows
+        self.ncols = ncols
+        self.nwords = mask_words(nrows, ncols)
+        self.dtype = position_dtype(self.nwords)
+        self.block = block
+        self.pending = []
+        self.count = 0
+        self.f = open(path, "wb")
+        self._write_header()
+
+    def _write_header(self):
+        header = _HEADER.pack(MAGIC, VERSION, self.nrows, self.ncols,
+                              self.nwords, self.count)
+        self.f.write(header.ljust(HEADER_SIZE, b"\0"))
+
+    def add_game(self, moves, result, draw_plies = DRAW_PLIES,
+                 repetitions = REPETITIONS):
+        """
+        Replays a game and adds every position reached before a move
+
+        Input:
+            moves (list[Move]): moves of the game
+            result (int): RESULT_ code of the game (see records.py)
+            draw_plies (int): draw rule the game was played with
+            repetitions (int): draw rule the game was played with
+
+        Returns: None
+        """
+        game = CheckersGame((self.nrows - 2) // 2, draw_plies, repetitions)
+        bits = game.board.bits
+        nwords = self.nwords
+        for move in moves:
+            side = game.get_curr_player().player_num
+            if result == side:
+                outcome = 1
+            elif result in (RESULT_P1, RESULT_P2):
+                outcome = -1
+            else:
+                outcome = 0
+            p1, p2, kings = bits.p1, bits.p2, bits.kings
+            self.pending.append((_split(p1 & ~kings, nwords),
+                                 _split(p1 & kings, nwords),
+                                 _split(p2 & ~kings, nwords),
+                                 _split(p2 & kings, nwords),
+                                 side, outcome, move.path[0], move.path[-1],
+                                 len(move.captures)))
+            if len(self.pending) == self.block:
+                self._flush()
+            game.make_move(move)
+
+    def _flush(self):
+        if self.pending:
+            self.f.write(np.array(self.pending, dtype = self.dtype).tobytes())
+        self.count += len(self.pending)
+        self.pending = []
+
+    def close(self):
+        """
+        Writes the buffered records and the final record count
+
+        Returns: None
+        """
+        self._flush()
+        self.f.seek(0)
+        self._write_header()
+        self.f.close()
+
+def export_archive(archive_path, out_path):
+    """
+    Converts a binary game archive (see records.py) into a position dataset
+
+    Input:
+        archive_path (str): game archive to read
+        out_path (str): dataset file to create
+
+    Returns: int number of positions written
+    """
+    writer = None
+    with open(archive_path, "rb") as f:
+        for record in read_games(f):
+            if writer is None:
+                writer = PositionWriter(out_path, record.nrows, record.ncols)
+            writer.add_game(record.moves, record.result,
+                            *draw_rules(record))
+    if writer is None:
+        return 0
+    writer.close()
+    return writer.count
+
+def load_positions(path):
+    """
+    Maps a dataset file into memory without reading it
+
+    Input:
+        path (str): dataset file
+
+    Returns: numpy.memmap of position_dtype records
+    """
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+    magic, version, _, _, nwords, count = _HEADER.unpack_from(header)
+    if magic != MAGIC or version != VERSION:
+        raise Exception("Not a position dataset")
+    if count == 0:
+        return np.zeros(0, dtype = position_dtype(nwords))
+    return np.memmap(path, dtype = position_dtype(nwords), mode = "r",
+                     offset = HEADER_SIZE, shape = (count,))
+
+def sample_batches(positions, batch_size, seed = None):
+    """
+    Yields the records in shuffled batches, visiting every record once.
+    Indices inside a batch are sorted so each batch reads the file in order.
+
+    Input:
+        positions (ndarray): records returned by load_positions
+        batch_size (int): records per batch
+        seed (None or int): seed of the shuffle
+
+    Returns: generator[ndarray]
+    """
+    order = np.random.default_rng(seed).permutation(len(positions))
+    for start in range(0, len(order), batch_size):
+        yield positions[np.sort(order[start:start + batch_size])]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description =
+    "Export the positions of a game archive as a training dataset")
+    parser.add_argument("archive", type = str)
+    parser.add_argument("out", type = str)
+    args = parser.parse_args()
+    print("{} positions written".format(export_archive(args.archive, args.out)))
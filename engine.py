@@ -0,0 +1,360 @@
+from time import perf_counter
+from hashing import TranspositionTable, EXACT, LOWER, UPPER
+from tablebase import WIN, LOSS
+from igl import MAN_VALUE, KING_VALUE
+
+WIN_SCORE = 100000
+WIN_BOUND = WIN_SCORE - 1000
+LMR_MOVES = 3
+# nodes searched between two looks at the clock
+CHECK_NODES = 1024
+
+class SearchTimeout(Exception):
+    """
+    Raised inside a search when its time budget runs out
+    """
+
+class SearchEngine:
+    """
+    Negamax alpha-beta search over a CheckersGame, played through
+    make_move/unmake_move so no position is ever copied. Results are kept in
+    a transposition table that lives as long as the engine, so later
+    searches reuse the work of earlier ones.
+    """
+    def __init__(self, max_depth = 64, table = None, tablebase = None,
+                 book = None):
+        """
+        Constructor
+
+        Args:
+            max_depth (int): deepest iteration the search will start
+            table (None or TranspositionTable): table to share with other
+            engines, a new one is made if None
+            tablebase (None or Tablebase): endgame tablebase probed instead
+            of searching positions it covers
+            book (None or OpeningBook): opening book played from without
+            searching while the game is in it
+
+        Attributes:
+            self.max_depth = deepest iteration the search will start
+            self.table = TranspositionTable of search results
+            self.tablebase = endgame Tablebase or None
+            self.book = OpeningBook or None
+            self.killers = two quiet moves per ply that caused a cutoff
+            self.history = cutoff score of quiet moves keyed by (from, to)
+            self.nodes = nodes visited by the last search
+            self.depth = depth of the last completed iteration
+            self.score = score of the last completed iteration
+        Returns: None
+        """
+        self.max_depth = max_depth
+        self.table = table if table is not None else TranspositionTable()
+        self.tablebase = tablebase
+        self.book = book
+        self.killers = []
+        self.history = {}
+        self.nodes = 0
+        self.depth = 0
+        self.score = 0
+        self.deadline = None
+        self._next_check = 0
+
+    def search(self, game, time_limit = 1.0, max_depth = None):
+        """
+        Finds the best move for the current player with iterative deepening,
+        returning the best move of the deepest iteration finished before the
+        time budget ran out. Positions in the opening book are answered from
+        the book without searching.
+
+        Input:
+            game (CheckersGame): game to search, restored before returning
+            time_limit (float): wall-clock budget in seconds
+            max_depth (None or int): overrides self.max_depth
+
+        Returns: Move or None if the current player cannot move
+        """
+        moves = game.legal_moves()
+        if not moves:
+            return None
+        self.nodes = 0
+        self.depth = 0
+        if self.book is not None:
+            move = self.book.choose(game)
+            if move is not None:
+                return move
+        if max_depth is None:
+            max_depth = self.max_depth
+        self.deadline = perf_counter() + time_limit
+        self._next_check = CHECK_NODES
+        self.killers = [[None, None] for _ in range(max_depth + 1)]
+        self.history = {}
+        self.table.new_search()
+
+        best_move = moves[0]
+        for depth in range(1, max_depth + 1):
+            undo_depth = len(game.undo_stack)
+            try:
+                score, move = self._root(game, moves, depth)
+            except SearchTimeout:
+                while len(game.undo_stack) > undo_depth:
+                    game.unmake_move()
+                break
+            best_move = move
+            self.depth = depth
+            self.score = score
+            # search the best move first in the next iteration
+            moves.remove(move)
+            moves.insert(0, move)
+            if abs(score) > WIN_BOUND:
+                break
+            if perf_counter() > self.deadline:
+                break
+        return best_move
+
+    def _root(self, game, moves, depth):
+        """
+        Searches every root move to a fixed depth
+
+        Input:
+            game (CheckersGame): game to search
+            moves (list[Move]): root moves, best guess first
+            depth (int): depth in plies
+
+        Returns: tuple (score, Move)
+        """
+        alpha = -WIN_SCORE - 1
+        beta = WIN_SCORE + 1
+        best_move = moves[0]
+        for i, move in enumerate(moves):
+            game.make_move(move)
+            if i == 0:
+                score = -self._negamax(game, depth - 1, -beta, -alpha, 1)
+            else:
+                score = -self._negamax(game, depth - 1, -alpha - 1, -alpha, 1)
+                if score > alpha:
+                    score = -self._negamax(game, depth - 1, -beta, -alpha, 1)
+            game.unmake_move()
+            if score > alpha:
+                alpha = score
+                best_move = move
+        return alpha, best_move
+
+    def _negamax(self, game, depth, alpha, beta, ply):
+        """
+        Alpha-beta search of the current position. Moves after the first are
+        searched with a null window (late quiet moves also one ply shallower)
+        and only re-searched when they beat it.
+
+        Input:
+            game (CheckersGame): game to search
+            depth (int): remaining depth in plies
+            alpha (int): lower bound of the search window
+            beta (int): upper bound of the search window
+            ply (int): distance from the root
+
+        Returns: int score for the current player
+        """
+        self.nodes += 1
+        if self.nodes >= self._next_check:
+            self._check_clock()
+        if self.tablebase is not None:
+            found = self.tablebase.probe(game.board.bits,
+            game.get_curr_player().player_num)
+            if found is not None:
+                return _tablebase_score(found, ply)
+        if depth <= 0:
+            return self._quiesce(game, alpha, beta, ply)
+
+        key = game.position_hash()
+        entry = self.table.probe(key)
+        tt_move = None
+        if entry is not None:
+            tt_move = entry[4]
+            if entry[1] >= depth:
+                score = _from_table(entry[3], ply)
+                flag = entry[2]
+                if (flag == EXACT or (flag == LOWER and score >= beta) or
+                (flag == UPPER and score <= alpha)):
+                    return score
+
+        bits = game.board.bits
+        player_num = game.get_curr_player().player_num
+        moves = bits.legal_moves(player_num)
+        if not moves:
+            return self._no_moves_score(bits, player_num, ply)
+
+        self._order(moves, ply, tt_move)
+        alpha_start = alpha
+        best_move = None
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        for i, move in enumerate(moves):
+            game.make_move(move)
+            if i == 0:
+                score = -self._negamax(game, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                # late quiet moves are first tried one ply shallower
+                reduce = (depth >= 3 and i >= LMR_MOVES and not move.captures
+                and move not in killers)
+                score = -self._negamax(game, depth - 1 - reduce, -alpha - 1,
+                -alpha, ply + 1)
+                if reduce and score > alpha:
+                    score = -self._negamax(game, depth - 1, -alpha - 1, -alpha,
+                    ply + 1)
+                if alpha < score < beta:
+                    score = -self._negamax(game, depth - 1, -beta, -alpha,
+                    ply + 1)
+            game.unmake_move()
+            if score > alpha:
+                alpha = score
+                best_move = move
+                if alpha >= beta:
+                    if not move.captures:
+                        pair = (move.path[0], move.path[-1])
+                        self.history[pair] = (self.history.get(pair, 0) +
+                        depth * depth)
+                        if killers and killers[0] != move:
+                            killers[1] = killers[0]
+                            killers[0] = move
+                    break
+        if alpha >= beta:
+            flag = LOWER
+        elif alpha > alpha_start:
+            flag = EXACT
+        else:
+            flag = UPPER
+        self.table.store(key, depth, flag, _to_table(alpha, ply),
+        best_move or tt_move)
+        return alpha
+
+    def _quiesce(self, game, alpha, beta, ply):
+        """
+        Searches captures only until the position is quiet. Jumps are never
+        forced, so the side to move may always stand on its evaluation. Only
+        jump sequences that cannot be continued are tried: the prefixes of
+        a multi-jump multiply on large boards and rarely score better.
+
+        Input:
+            game (CheckersGame): game to search
+            alpha (int): lower bound of the search window
+            beta (int): upper bound of the search window
+            ply (int): distance from the root
+
+        Returns: int score for the current player
+        """
+        bits = game.board.bits
+        player_num = game.get_curr_player().player_num
+        stand = evaluate(bits, player_num)
+        if stand >= beta:
+            return stand
+        if stand > alpha:
+            alpha = stand
+        for move in bits.jump_moves(player_num, True):
+            self.nodes += 1
+            if self.nodes >= self._next_check:
+                self._check_clock()
+            game.make_move(move)
+            score = -self._quiesce(game, -beta, -alpha, ply + 1)
+            game.unmake_move()
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+        return alpha
+
+    def _check_clock(self):
+        """
+        Raises SearchTimeout once the time budget has run out, and sets the
+        node count of the next check
+
+        Returns: None
+        """
+        self._next_check = self.nodes + CHECK_NODES
+        if perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+    def _no_moves_score(self, bits, player_num, ply):
+        """
+        Scores a position where the current player has no move: a draw if
+        the opponent cannot move either, otherwise a loss
+
+        Returns: int
+        """
+        if bits.can_move(3 - player_num):
+            return -WIN_SCORE + ply
+        return 0
+
+    def _order(self, moves, ply, tt_move = None):
+        """
+        Sorts moves in place: the transposition table move first, then
+        longest captures, then killer moves, then quiet moves by history score
+
+        Input:
+            moves (list[Move]): moves of the current position
+            ply (int): distance from the root
+            tt_move (None or Move): best move stored for the position
+
+        Returns: None
+        """
+        killers = self.killers[ply] if ply < len(self.killers) else (None, None)
+        history = self.history
+
+        def key(move):
+            if move == tt_move:
+                return 2000000
+            if move.captures:
+                return 1000000 + len(move.captures)
+            if move == killers[0]:
+                return 900000
+            if move == killers[1]:
+                return 800000
+            return history.get((move.path[0], move.path[-1]), 0)
+
+        moves.sort(key = key, reverse = True)
+
+def _to_table(score, ply):
+    """
+    Makes a win or loss score relative to the position it is stored for
+    rather than to the root
+    """
+    if score > WIN_BOUND:
+        return score + ply
+    if score < -WIN_BOUND:
+        return score - ply
+    return score
+
+def _from_table(score, ply):
+    if score > WIN_BOUND:
+        return score - ply
+    if score < -WIN_BOUND:
+        return score + ply
+    return score
+
+def _tablebase_score(found, ply):
+    """
+    Turns a tablebase result into a search score, wins and losses counting
+    the plies from the root to the end of the game
+    """
+    result, distance = found
+    if result == WIN:
+        return WIN_SCORE - ply - distance
+    if result == LOSS:
+        return -WIN_SCORE + ply + distance
+    return 0
+
+def evaluate(bits, player_num):
+    """
+    Material evaluation of a BitBoard from a player's point of view
+
+    Input:
+        bits (BitBoard): position to evaluate
+        player_num (int): player to score for
+
+    Returns: int
+    """
+    kings = bits.kings
+    own = bits.pieces(player_num)
+    other = bits.pieces(3 - player_num)
+    own_kings = (own & kings).bit_count()
+    other_kings = (other & kings).bit_count()
+    return (MAN_VALUE * (own.bit_count() - other.bit_count()) +
+    (KING_VALUE - MAN_VALUE) * (own_kings - other_kings))
@@ -0,0 +1,133 @@
+import random
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+_zobrist_cache = {}
+
+class ZobristKeys:
+    """
+    Random 64 bit keys for every (player, rank, square) of one board size.
+    Keys are drawn from a generator seeded with the board size, so every
+    process computes the same hash for the same position.
+    """
+    def __init__(self, nrows, ncols):
+        """
+        Constructor
+
+        Args:
+            nrows (int): number of rows
+            ncols (int): number of columns
+
+        Attributes:
+            self.men = keys of each player's men, indexed by BitBoard square
+            self.kings = keys of each player's kings, indexed by square
+            self.side = key mixed in when player 2 is to move
+        Returns: None
+        """
+        rng = random.Random("zobrist {}x{}".format(nrows, ncols))
+        nsquares = (nrows * (ncols + 1)) // 2
+        self.men = {}
+        self.kings = {}
+        for player_num in (1, 2):
+            self.men[player_num] = [rng.getrandbits(64) for _ in range(nsquares)]
+            self.kings[player_num] = [rng.getrandbits(64)
+                                      for _ in range(nsquares)]
+        self.side = rng.getrandbits(64)
+
+def zobrist_keys(nrows, ncols):
+    """
+    Returns the Zobrist keys for a board size, creating them on first use
+
+    Input:
+        nrows (int): number of rows
+        ncols (int): number of columns
+
+    Returns: ZobristKeys
+    """
+    keys = _zobrist_cache.get((nrows, ncols))
+    if keys is None:
+        keys = ZobristKeys(nrows, ncols)
+        _zobrist_cache[(nrows, ncols)] = keys
+    return keys
+
+class TranspositionTable:
+    """
+    Fixed-size hash table of search results keyed by Zobrist hash. Every
+    bucket has two slots: one kept for the deepest result (replaced only by
+    a result at least as deep or left over from an older search) and one
+    that always takes the newest result. Memory stays bounded no matter how
+    many positions are stored.
+    """
+    def __init__(self, size_bits = 20):
+        """
+        Constructor
+
+        Args:
+            size_bits (int): the table holds 2 ** size_bits buckets
+
+        Attributes:
+            self.mask = mask turning a hash into a bucket index
+            self.slots = two entries per bucket, each None or a tuple
+            (hash, depth, flag, score, move, generation)
+            self.generation = counter of searches, used to age out entries
+        Returns: None
+        """
+        self.mask = (1 << size_bits) - 1
+        self.slots = [None] * (2 << size_bits)
+        self.generation = 0
+
+    def new_search(self):
+        """
+        Marks the start of a new search so results of older searches become
+        the first to be replaced
+
+        Returns: None
+        """
+        self.generation += 1
+
+    def probe(self, key):
+        """
+        Looks up the entry stored for a hash
+
+        Input:
+            key (int): Zobrist hash of the position
+
+        Returns: tuple or None
+        """
+        i = (key & self.mask) << 1
+        entry = self.slots[i]
+        if entry is not None and entry[0] == key:
+            return entry
+        entry = self.slots[i + 1]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        """
+        Stores a search result
+
+        Input:
+            key (int): Zobrist hash of the position
+            depth (int): depth the position was searched to
+            flag (int): EXACT, LOWER or UPPER bound
+            score (int): score of the position
+            move (None or Move): best move found
+
+        Returns: None
+        """
+        i = (key & self.mask) << 1
+        slots = self.slots
+        entry = (key, depth, flag, score, move, self.generation)
+        deep = slots[i]
+        if (deep is None or deep[0] == key or depth >= deep[1] or
+        deep[5] != self.generation):
+            slots[i] = entry
+        else:
+            slots[i + 1] = entry
+
+    def clear(self):
+        self.slots = [None] * len(self.slots)
+        self.generation = 0
@@ -1,12 +1,42 @@
 import numpy as np
+from bitboard import BitBoard, DIRECTIONS, Move, iter_bits
+from collections import deque
+import json
+import socket
+
+# Default draw rules: the same position reached for the third time, or 80
+# plies (40 moves each) without a capture or a man moving
+REPETITIONS = 3
+DRAW_PLIES = 80
+
+# Material value of each kind of piece, used by material() and by the
+# evaluation of engine.py and batch.py
+MAN_VALUE = 100
+KING_VALUE = 160
+
+# Square codes: CheckerPiece.value of each kind of piece, EMPTY for a
+# square without one
+EMPTY, P1_MAN, P1_KING, P2_MAN, P2_KING = range(5)
+
+# Indices into BoardGeometry.neighbors of the directions a piece may step
+# in, keyed by (forward, is king), in the order get_possible_moves lists
+# them: a king's backward steps come before the forward ones
+_STEP_DIRECTIONS = {
+    (f, king): tuple(DIRECTIONS.index(d) for d in
+                     ([(-f, f), (-f, -f)] if king else []) + [(f, f), (f, -f)])
+    for f in (-1, 1) for king in (False, True)}
 
 class CheckersGame:
-    def __init__(self, n):
+    def __init__(self, n, draw_plies = DRAW_PLIES, repetitions = REPETITIONS):
         """
         Constructor
         
         Args:
             n (int): number of rows of pieces per player
+            draw_plies (int): plies without a capture or a man moving after
+            which the game is drawn, 0 for no limit
+            repetitions (int): times a position may be reached before the
+            game is drawn, 0 to never draw by repetition
             
         Attributes:
             self.player1 = Player Class Object for player 1
@@ -14,6 +44,10 @@ class CheckersGame:
             self.board = Board Class Object for the game
             self.turn = turn count of game
             self.turn_types = dictionary of turn functions given an input
+            self.undo_stack = moves played with make_move and their undo data
+            self.quiet_plies = plies since the last capture or man move
+            self.seen = times each position (see position_hash) was reached
+            since the last capture or man move
         Returns: None
         """
         super(CheckersGame, self).__init__()
@@ -26,6 +60,10 @@ class CheckersGame:
         self.turn = 1
         self.mod_to_player = {1:self.player1, 0:self.player2}
         self.turn_types = {"move":self.move_piece, "jump": self.jump_piece}
+        self.undo_stack = []
+        self.draw_plies = draw_plies
+        self.repetitions = repetitions
+        self.reset_history()
 
     def get_curr_player(self):
         return self.mod_to_player[self.turn %  2]
@@ -35,21 +73,26 @@ class CheckersGame:
 
     def tuple_loc(self, input_val = None):
         """
-        Takes in a console line input and turns into a tuple containing the 
-        location index for a piece. Or returns False if the input was "resign"
-        Returns: tuple[int] or False
+        Takes in a console line input, given from the current player's view
+        of the board, and turns it into a tuple containing the location index
+        for a piece on the board
+        Returns: tuple[int]
         """
-        raw_loc = list(input_val)
         try:
-            row = ord(raw_loc[0].upper())
-            col = int(raw_loc[1])
+            row = ord(input_val[0].upper())
+            col = int(input_val[1:])
         except:
             raise Exception("Invalid input")
         loc_tup = tuple([row - 65, col - 1])
-        return loc_tup
+        return self.board.view_loc(loc_tup, self.get_curr_player())
 
     def de_tuple_loc(self, loc_tuple):
-        row, col = loc_tuple
+        """
+        Turns a location index into its name from the current player's view
+        of the board
+        Returns: str
+        """
+        row, col = self.board.view_loc(loc_tuple, self.get_curr_player())
         row = chr(row + 65)
         col = str(col + 1)
 
@@ -63,21 +106,16 @@ class CheckersGame:
             new_loc (tuple): new location index of the piece
         Returns: bool
         """
-        curr_loc_r, curr_loc_c = curr_loc
-        new_loc_r, new_loc_c = new_loc
-
-        piece = self.board.board[curr_loc_r][curr_loc_c]
-        try:
-            self.board.check_loc(new_loc, None)
-        except:
+        board = self.board
+        bits = board.bits
+        squares = board.squares
+        dst = squares.get(new_loc)
+        row_step = board.step_rows.get((squares.get(curr_loc), dst))
+        if row_step is None or (bits.p1 | bits.p2) >> dst & 1:
             return False
-
-        if abs(new_loc_c - curr_loc_c) == 1:
-            if not piece.king and curr_loc_r - new_loc_r == 1:
-                return True
-            elif piece.king and abs(new_loc_r - curr_loc_r) == 1:
-                return True
-        return False
+        if bits.kings >> squares[curr_loc] & 1:
+            return True
+        return row_step == self.get_curr_player().forward
 
     def can_jump_piece(self, curr_loc, new_loc):
         """
@@ -88,27 +126,14 @@ class CheckersGame:
         
         Returns: bool
         """
-        curr_loc_r, curr_loc_c = curr_loc
-        new_loc_r, new_loc_c = new_loc
-        curr_piece = self.board.board[curr_loc_r][curr_loc_c]
-        try:
-            self.board.check_loc(new_loc, None)
-        except:
+        board = self.board
+        bits = board.bits
+        squares = board.squares
+        land = squares.get(new_loc)
+        jumped = board.jumped.get((squares.get(curr_loc), land))
+        if jumped is None or (bits.p1 | bits.p2) >> land & 1:
             return False
-
-        r_diff = curr_loc_r - new_loc_r
-        c_diff = curr_loc_c - new_loc_c
-        j_r, j_c = self.board._get_jumpover_piece_loc(curr_loc, new_loc)
-
-        jumpover_piece = self.board.board[j_r][j_c]
-        if not isinstance(jumpover_piece, CheckerPiece):
-            return False
-        if jumpover_piece.player != self.get_other_player():
-            return False
-        if (abs(r_diff) == 2 and abs(c_diff) == 2 and jumpover_piece and 
-        jumpover_piece != curr_piece):
-            return True
-        return False
+        return bits.owner(jumped) == self.get_other_player().player_num
 
     def move_piece(self, curr_loc, new_loc):
         return self.board.move_piece(curr_loc, new_loc)
@@ -124,21 +149,56 @@ class CheckersGame:
         
         Returns: None
         """
-        loc_r, loc_c = loc
-        if loc_r == 0:
-            self.board.board[loc_r][loc_c].king_piece()
+        loc_r, _ = loc
+        if loc_r == self.get_curr_player().king_row:
+            self.board.king_piece(loc)
 
     def _check_draw(self):
         """
-        Checks if there is a possible draw in the match
+        Checks the draw rules: a position reached too many times or too many
+        plies without a capture or a man moving. Both are counted by
+        _record_position, so this takes constant time.
 
         Returns: bool
         """
-        can_opponent_move = self._can_move_any()
-        self.turn += 1
-        can_current_move = self._can_move_any()
-        self.turn -= 1
-        return not can_current_move and not can_opponent_move
+        if self.repetitions and \
+        self.seen[self.position_hash()] >= self.repetitions:
+            return True
+        return bool(self.draw_plies) and self.quiet_plies >= self.draw_plies
+
+    def _record_position(self):
+        """
+        Adds the position reached by a turn to the draw history. A capture or
+        a man moving (or being kinged) means no earlier position can occur
+        again, so the history is restarted.
+
+        Returns: None
+        """
+        bits = self.board.bits
+        men = (bits.p1 | bits.p2) & ~bits.kings
+        pieces = self.player1.piece_count + self.player2.piece_count
+        if men != self._men or pieces != self._pieces:
+            self._men = men
+            self._pieces = pieces
+            self.quiet_plies = 0
+            self.seen.clear()
+        else:
+            self.quiet_plies += 1
+        key = self.position_hash()
+        self.seen[key] = self.seen.get(key, 0) + 1
+
+    def reset_history(self):
+        """
+        Starts the draw history from the current position, needed only after
+        the BitBoard masks are set directly
+
+        Returns: None
+        """
+        bits = self.board.bits
+        self._men = (bits.p1 | bits.p2) & ~bits.kings
+        self._pieces = self.player1.piece_count + self.player2.piece_count
+        self.quiet_plies = 0
+        self.seen = {self.position_hash(): 1}
 
     def _check_winner(self):
         """
@@ -146,26 +206,23 @@ class CheckersGame:
         
         Returns: bool
         """
-        if self.get_other_player().piece_count == 0 or not self._can_move_any():
+        if self.get_curr_player().piece_count == 0 or not self._can_move_any():
             return True
         return False
 
-    def _can_move_any(self):
+    def _can_move_any(self, player = None):
         """
-        Iterates over the current player's pieces to see if they can move any 
-        of their pieces
+        Checks if a player (the current player by default) can move any of
+        their pieces, using whole-board shifts on the BitBoard
         
+        Input:
+            player (None or Player): player to check
+
         Returns: bool
         """
-        for i, row in enumerate(self.board.board):
-            for j, p in enumerate(row):
-                if (isinstance(p, CheckerPiece) and 
-                p.player == self.get_curr_player()):
-                    move_options = self.get_possible_moves((i,j))
-                    jump_options = self.get_possible_jumps((i,j))
-                    if len(move_options) > 0 or len(jump_options) > 0:
-                        return True
-        return False
+        if player is None:
+            player = self.get_curr_player()
+        return self.board.bits.can_move(player.player_num)
 
     def get_possible_moves(self, loc):
         """
@@ -177,84 +234,37 @@ class CheckersGame:
             
         Returns: list[tuple]
         """
-        i, j = loc
-        piece = self.board.board[i][j]
+        bits = self.board.bits
+        sq = self.board.squares.get(loc)
+        if sq is None:
+            return []
+        geometry = bits.geometry
+        neighbors = geometry.neighbors[sq]
+        occupied = bits.p1 | bits.p2
+        king = bool(bits.kings >> sq & 1)
         possible_moves = []
-        if piece.king:
-            if self.can_move_piece((i,j), (i+1, j-1)):
-                possible_moves.append((i+1, j-1))
-            if self.can_move_piece((i,j), (i+1, j+1)):
-                possible_moves.append((i+1, j+1))
-        if self.can_move_piece((i,j), (i-1,j-1)):
-            possible_moves.append((i-1,j-1))
-        if self.can_move_piece((i,j), (i-1,j+1)):
-            possible_moves.append((i-1,j+1))
+        for d in _STEP_DIRECTIONS[(self.get_curr_player().forward, king)]:
+            dst = neighbors[d]
+            if dst is not None and not occupied >> dst & 1:
+                possible_moves.append(geometry.locs[dst])
 
         return possible_moves
 
-    def get_possible_jumps(self, loc, ol = None, current_path = None):
+    def get_possible_jumps(self, loc):
         """
-        Collects the possible jumps a piece can make. Returns the locations it
-        can move to
+        Collects the possible jumps a piece can make, one Move for every jump
+        sequence including each prefix of a multi-jump
         
         Input:
             loc (tuple): location of a piece
             
-        Returns: list
+        Returns: list[Move]
         """
-        i, j = loc
-        possible_jumps = []
-
-        if ol:
-            oi, oj = ol
-            original_piece = self.board.board[oi][oj]
-            piece = original_piece
-        else:
-            piece = self.board.board[i][j]
-            ol = loc
-            current_path = []
-
-        if not isinstance(piece, CheckerPiece):
-            return possible_jumps
-
-        if piece.king:
-            king_jump_locations = [(i+2, j-2), (i+2, j+2)]
-            for location in king_jump_locations:
-                if self.can_jump_piece((loc), location):
-                    new_loc = location
-                    self._get_additional_jumps(new_loc, possible_jumps, ol, 
-                    current_path)
-
-        regular_jump_locations = [(i-2, j-2), (i-2, j+2)]
-        for location in regular_jump_locations:
-            if self.can_jump_piece(loc, location):
-                new_loc = location
-                self._get_additional_jumps(new_loc, possible_jumps, ol, 
-                current_path)
-
-        return possible_jumps
-
-    def _get_additional_jumps(self, loc, possible_jumps, ol, current_path):
-        """
-        Given that a piece can jump from one place to another, examines if it
-        can move farther down the board
-        
-        Input:
-            loc (tuple): location to be checked for additional jumps
-            possible_jumps (list): list of currently possible jump paths
-            ol (tuple): original location of the piece
-            current_path (list): the current path of locatiosn the peice will 
-            travel
-
-        Returns: None
-            """
-        possible_jumps.append(tuple(loc))
-        current_path += [loc]
-        more_possible_jumps = self.get_possible_jumps(loc, ol, current_path)
-        if more_possible_jumps:
-            mapped_p_moves = [current_path + [x] for x in more_possible_jumps]
-            
-            possible_jumps += mapped_p_moves
+        player_num = self.get_curr_player().player_num
+        if self.board.owner(loc) != player_num:
+            return []
+        bits = self.board.bits
+        return list(bits.jump_sequences(bits.square(loc), player_num))
 
     def complete_turn(self, choice, board_loc, possible_moves, possible_jumps):
         """
@@ -265,7 +275,7 @@ class CheckersGame:
             choice (int): option selected
             board_loc (tuple): location of piece
             possible_moves (list): list of possible moves
-            possible_jumps (list): list of possible jumps
+            possible_jumps (list[Move]): list of possible jumps
             
         Returns: tuple
         """
@@ -275,15 +285,11 @@ class CheckersGame:
             board_new_loc = self.tuple_loc(possible_moves[choice - 1])
             self.board.move_piece(board_loc, board_new_loc)
         else:
-            move_selection = possible_jumps[choice - nmoves - 1]
-            if isinstance(move_selection, list):
-                for i in possible_jumps[choice - nmoves - 1][:-1]:
-                    board_new_loc = i
-                    self.board.jump_piece(board_loc, board_new_loc)
-                    board_loc = i
-            else:
-                board_new_loc = possible_jumps[choice - nmoves - 1]
+            move = possible_jumps[choice - nmoves - 1]
+            for sq in move.path[1:]:
+                board_new_loc = self.board.bits.loc(sq)
                 self.board.jump_piece(board_loc, board_new_loc)
+                board_loc = board_new_loc
         return board_new_loc
 
     def end_turn(self, loc):
@@ -298,16 +304,321 @@ class CheckersGame:
         self._check_for_kingship(loc)
 
         self.turn += 1
-        self.board._flip_board()
+        return self._check_end()
+
+    def _check_end(self):
+        """
+        Checks if the game has ended now that the turn has passed. The
+        position is added to the draw history, so this is called once per
+        turn, by end_turn or play_move. Moves taken back with unmake_move
+        stay in the history.
+
+        Returns: None or str ("draw" or "winner")
+        """
+        self._record_position()
+        if self._check_winner():
+            # a player who cannot move loses, unless neither player can
+            if self._can_move_any(self.get_other_player()):
+                return "winner"
+            return "draw"
+
         if self._check_draw():
             return "draw"
 
-        if self._check_winner():
-            return "winner"
+    def position_hash(self):
+        """
+        Zobrist hash of the position, including which player is to move
+
+        Returns: int
+        """
+        bits = self.board.bits
+        if self.turn % 2:
+            return bits.hash
+        return bits.hash ^ bits.zobrist.side
+
+    def legal_moves(self):
+        """
+        Collects every move the current player can make, jumps first
+
+        Returns: list[Move]
+        """
+        return self.board.bits.legal_moves(self.get_curr_player().player_num)
+
+    def play_move(self, move):
+        """
+        Plays a whole turn given as a Move, as an alternative to
+        complete_turn and end_turn
+
+        Input:
+            move (Move): move to play, given as BitBoard squares
+
+        Returns: None or str ("draw" or "winner")
+        """
+        self.make_move(move)
+        return self._check_end()
+
+    def describe_move(self, move):
+        """
+        Names the squares of a Move from the current player's view
+
+        Input:
+            move (Move): move given as BitBoard squares
+
+        Returns: str
+        """
+        locs = [self.de_tuple_loc(self.board.bits.loc(sq)) for sq in move.path]
+        action = " jump to " if move.captures else " move to "
+        return locs[0] + action + " to ".join(locs[1:])
+
+    def make_move(self, move):
+        """
+        Plays a move for the current player and passes the turn. Only the
+        BitBoard, the piece counts and the turn are updated, so a move can
+        be made and taken back without copying anything.
+
+        Input:
+            move (Move): move to play, given as BitBoard squares
+
+        Returns: None
+        """
+        turn = self.turn
+        player = self.mod_to_player[turn % 2]
+        token = self.board.bits.apply(move, player.player_num)
+        captured_kings, kinged, _ = token
+        if move.captures:
+            opponent = self.mod_to_player[(turn + 1) % 2]
+            nkings = captured_kings.bit_count()
+            opponent.kings -= nkings
+            opponent.men -= len(move.captures) - nkings
+        if kinged:
+            player.men -= 1
+            player.kings += 1
+        self.undo_stack.append((move, token))
+        self.turn = turn + 1
+
+    def unmake_move(self):
+        """
+        Takes back the last move played with make_move, restoring the exact
+        previous state
+
+        Returns: Move
+        """
+        move, token = self.undo_stack.pop()
+        turn = self.turn - 1
+        self.turn = turn
+        player = self.mod_to_player[turn % 2]
+        self.board.bits.undo(move, player.player_num, token)
+        captured_kings, kinged, _ = token
+        if move.captures:
+            opponent = self.mod_to_player[(turn + 1) % 2]
+            nkings = captured_kings.bit_count()
+            opponent.kings += nkings
+            opponent.men += len(move.captures) - nkings
+        if kinged:
+            player.men += 1
+            player.kings -= 1
+        return move
+
+    def sync_counts(self):
+        """
+        Recounts both players' men and kings from the BitBoard, needed only
+        after its masks are set directly
+
+        Returns: None
+        """
+        bits = self.board.bits
+        for player in (self.player1, self.player2):
+            own = bits.pieces(player.player_num)
+            player.kings = (own & bits.kings).bit_count()
+            player.men = own.bit_count() - player.kings
 
-class OnlineCheckersGame():
+    def snapshot(self):
+        """
+        The position, turn and draw rules of the game as a tuple of ints, to
+        rebuild it with from_snapshot, for instance in another process. The
+        undo stack and draw history are not kept.
+
+        Returns: tuple of n, the p1, p2 and kings masks, turn, draw_plies and
+        repetitions
+        """
+        bits = self.board.bits
+        return ((bits.nrows - 2) // 2, bits.p1, bits.p2, bits.kings,
+                self.turn, self.draw_plies, self.repetitions)
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """
+        Builds a game from a tuple laid out as snapshot returns it, its draw
+        history starting from that position
+
+        Input:
+            snapshot (tuple): state returned by snapshot
+
+        Returns: CheckersGame
+        """
+        n, p1, p2, kings, turn, draw_plies, repetitions = snapshot
+        game = cls(n, draw_plies, repetitions)
+        bits = game.board.bits
+        bits.p1, bits.p2, bits.kings = p1, p2, kings
+        bits.hash = bits.compute_hash()
+        game.sync_counts()
+        game.turn = turn
+        game.reset_history()
+        return game
+
+    def material(self, player = None):
+        """
+        Material balance from a player's point of view (the current player by
+        default), the same score as engine.evaluate, read from the piece
+        counts without looking at the board
+
+        Input:
+            player (None or Player): player to score for
+
+        Returns: int
+        """
+        if player is None:
+            player = self.get_curr_player()
+        other = self.player2 if player is self.player1 else self.player1
+        return (MAN_VALUE * (player.men - other.men) +
+                KING_VALUE * (player.kings - other.kings))
+
+class OnlineCheckersGame(CheckersGame):
+    """
+    Game played against a remote player through a game server (see
+    server.py). The game is mirrored locally so it can be shown and the
+    local player's moves checked before they are sent.
+    """
     def __init__(self, game_options):
-        raise NotImplementedError("Online was not implemented")
+        """
+        Constructor. Blocks until the server has found an opponent.
+
+        Args:
+            game_options (dict): "host" and "port" of the server, "nrows"
+            and optionally "game", the id of an open game to join
+
+        Attributes:
+            self.player_num = number of the player this client plays
+            self.game_id = id of the game on the server
+            self.pending_move = Move of the turn being completed
+            self.events = messages received while waiting for a reply
+        Returns: None
+        """
+        super(OnlineCheckersGame, self).__init__(game_options["nrows"])
+        self.sock = socket.create_connection((game_options["host"],
+                                              game_options["port"]))
+        self.stream = self.sock.makefile("rwb")
+        self.events = deque()
+        self.pending_move = None
+        if game_options.get("game"):
+            reply = self._request({"op": "join", "game": game_options["game"]})
+        else:
+            reply = self._request({"op": "match",
+                                   "nrows": game_options["nrows"]})
+        self.game_id = reply["game"]
+        self.player_num = reply["player"]
+        if not reply["started"]:
+            self._next_event("start")
+
+    def _read(self):
+        line = self.stream.readline()
+        if not line:
+            raise Exception("Lost connection to the server")
+        return json.loads(line)
+
+    def _request(self, request):
+        """
+        Sends a request and waits for its reply, keeping any event that
+        arrives first
+
+        Returns: dict
+        """
+        self.stream.write((json.dumps(request) + "\n").encode())
+        self.stream.flush()
+        while True:
+            message = self._read()
+            if "event" in message:
+                self.events.append(message)
+            elif not message["ok"]:
+                raise Exception(message["error"])
+            else:
+                return message
+
+    def _next_event(self, *names):
+        while True:
+            event = self.events.popleft() if self.events else self._read()
+            if event.get("event") in names:
+                return event
+
+    def wait_for_move(self):
+        """
+        Waits for the opponent's move
+
+        Returns: Move or None if the opponent resigned or left
+        """
+        event = self._next_event("move", "end")
+        if event["event"] == "end":
+            return None
+        path = tuple(event["path"])
+        for move in self.legal_moves():
+            if move.path == path:
+                return move
+        raise Exception("The server sent an illegal move")
+
+    def complete_turn(self, choice, board_loc, possible_moves, possible_jumps):
+        end_loc = super(OnlineCheckersGame, self).complete_turn(choice,
+        board_loc, possible_moves, possible_jumps)
+        if choice <= len(possible_moves):
+            self.pending_move = Move((self.board._square(board_loc),
+                                      self.board._square(end_loc)), ())
+        else:
+            self.pending_move = possible_jumps[choice - len(possible_moves) - 1]
+        return end_loc
+
+    def end_turn(self, loc):
+        """
+        Ends the local player's turn and sends the move to the server
+
+        Returns: None or str ("draw", "winner" or "left" if the opponent
+        resigned or disconnected before the move reached the server)
+        """
+        end = super(OnlineCheckersGame, self).end_turn(loc)
+        try:
+            self._request({"op": "move", "game": self.game_id,
+                           "path": list(self.pending_move.path)})
+        except Exception:
+            # the server ends the game before it rejects the move
+            if not self._take_end_event():
+                raise
+            return "left"
+        return end
+
+    def _take_end_event(self):
+        """
+        Removes the end event of this game from the events received so far
+
+        Returns: bool, False if there is none
+        """
+        for event in self.events:
+            if event.get("event") == "end" and \
+               event.get("game") == self.game_id:
+                self.events.remove(event)
+                return True
+        return False
+
+    def resign(self):
+        """
+        Resigns the game and closes the connection
+
+        Returns: None
+        """
+        try:
+            self._request({"op": "resign", "game": self.game_id})
+        except Exception:
+            pass
+        # the file made by makefile holds the socket open as well
+        self.stream.close()
+        self.sock.close()
 
 class Board: 
     def __init__(self, nrows, ncols, p1, p2):
@@ -388,23 +699,82 @@ class Board:
         self.board[curr_loc_r][curr_loc_c] = self.board[new_loc_r][new_loc_c]
         self.board[new_loc_r][new_loc_c] = temp
 
-    def _flip_board(self):
+    def view(self, player):
         """
-        Flips board and its representation
-        
-        Returns: None
+        Returns the board as seen by a player. Player 1 sees the board in its
+        stored orientation, player 2 sees it rotated 180 degrees. The rotation
+        is a reversed view of the same array, nothing is copied.
+
+        Input:
+            player (Player): player looking at the board
+
+        Returns: ndarray
         """
-        self.board = np.rot90(np.rot90(self.board))
-        
+        if player.player_num == 1:
+            return self.board
+        return self.board[::-1, ::-1]
+
+    def view_loc(self, loc, player):
+        """
+        Converts a location index between the stored orientation and a
+        player's view of the board. The conversion is its own inverse.
+
+        Input:
+            loc (tuple): location index
+            player (Player): player looking at the board
+
+        Returns: tuple[int]
+        """
+        if player.player_num == 1:
+            return loc
+        nrows, ncols = self.board.shape
+        loc_r, loc_c = loc
+        return (nrows - 1 - loc_r, ncols - 1 - loc_c)
+
 class CheckerBoard(Board):
     def __init__(self, nrows, ncols, p1, p2):
+        """
+        Constructor
+
+        Attributes:
+            self.bits = BitBoard holding the game state used by the rules
+            self.board = object array rendered from self.bits when read
+            self.squares = BitBoard square of every playable location
+            self.step_rows = row step of every (square, neighbour) pair
+            self.jumped = jumped square of every (square, landing) pair
+        Returns: None
+        """
         self.player1 = p1
         self.player2 = p2
-        self.board  = self._create_board(nrows, ncols)
+        self.nrows = nrows
+        self.ncols = ncols
+        self.bits = BitBoard(nrows, ncols)
+        # lookup tables shared by every board of this size
+        geometry = self.bits.geometry
+        self.squares = geometry.squares
+        self.step_rows = geometry.step_rows
+        self.jumped = geometry.jumped
+        self._view = None
+        self._view_state = None
+
+    @property
+    def board(self):
+        """
+        Object array view of the board, only rebuilt when the BitBoard has
+        changed since it was last read
+
+        Returns: ndarray
+        """
+        bits = self.bits
+        state = (bits.p1, bits.p2, bits.kings)
+        if state != self._view_state:
+            self._view = self._create_board(self.nrows, self.ncols)
+            self._view_state = state
+        return self._view
 
     def _create_board(self, nrows, ncols):
         """
-        Initializes the board given the dimensions of rows and columns
+        Builds the object array of CheckerPieces from the BitBoard
         
         Input:
             nrows (int): number of rows
@@ -413,22 +783,67 @@ class CheckerBoard(Board):
         Returns: ndarray
         """
         board = np.full((nrows, ncols), None)
+        bits = self.bits
 
-        for i, row in enumerate(board):
-            for j, _ in enumerate(row):
-                if i >= (nrows / 2 + 1):
-                    piece = CheckerPiece(self.player1)
-                elif i <= (nrows / 2 - 2):
-                    piece = CheckerPiece(self.player2)
-                else:
-                    continue
-                if i % 2 == 0 and j % 2 != 0:
-                    board[i][j] = piece
-                elif i % 2 != 0 and j % 2 == 0:
-                    board[i][j] = piece
+        locs = bits.geometry.locs
+        kings = bits.kings
+        for player in (self.player1, self.player2):
+            pieces = player.pieces
+            for sq in iter_bits(bits.pieces(player.player_num)):
+                board[locs[sq]] = pieces[kings >> sq & 1]
 
         return board
     
+    def _square(self, loc):
+        """
+        Finds the BitBoard square of a location
+
+        Input:
+            loc (tuple): location index
+
+        Returns: int or None if the location is not a playable square
+        """
+        return self.squares.get(loc)
+
+    def owner(self, loc):
+        """
+        Finds the number of the player owning the piece at a location
+
+        Input:
+            loc (tuple): location index
+
+        Returns: int (0 if there is no piece)
+        """
+        sq = self._square(loc)
+        if sq is None:
+            return 0
+        return self.bits.owner(sq)
+
+    def is_king(self, loc):
+        sq = self._square(loc)
+        return sq is not None and self.bits.is_king(sq)
+
+    def check_loc(self, loc, expected_val = None):
+        """
+        Checks to see if the provided location is a playable square that
+        contains the expected value
+
+        Input:
+            loc (tuple): location index
+            expected_val (None or Player): the expected owner of the square
+
+        Returns: None or Exception
+        """
+        sq = self._square(loc)
+        if sq is None:
+            raise Exception("not a valid location")
+        owner = self.bits.owner(sq)
+        if expected_val is None:
+            if owner:
+                raise Exception("not a valid location")
+        elif owner != expected_val.player_num:
+            raise Exception("invald location")
+
     def check_for_piece(self, loc):
         """
         Checks to see if given a location, that a Checker piece is there
@@ -438,10 +853,36 @@ class CheckerBoard(Board):
             
         Returns: None or Exception
         """
-        i, j = loc
-        if not isinstance(self.board[i][j], CheckerPiece):
+        if not self.owner(loc):
             raise Exception()
 
+    def move_piece(self, curr_loc, new_loc):
+        """
+        Moves a piece to an empty location
+        Input:
+            curr_loc (tuple): current location index of the piece
+            new_loc (tuple): new location index of the piece
+        Returns: None
+        """
+        self.bits.move(self._square(curr_loc), self._square(new_loc))
+
+    def king_piece(self, loc):
+        """
+        Kings the piece at a location
+        Input:
+            loc (tuple): location index of the piece
+        Returns: None
+        """
+        sq = self._square(loc)
+        if not self.bits.is_king(sq):
+            player = self._player(sq)
+            player.men -= 1
+            player.kings += 1
+        self.bits.king(sq)
+
+    def _player(self, sq):
+        return self.player1 if self.bits.p1 >> sq & 1 else self.player2
+
     def _get_jumpover_piece_loc(self, curr_loc, new_loc):
         """
         Finds and returns the location index of the piece in between the points
@@ -453,13 +894,11 @@ class CheckerBoard(Board):
             
         Returns: tuple[int]
         """
-        curr_loc_r, curr_loc_c = curr_loc
-        new_loc_r, new_loc_c = new_loc
-
-        r_diff_mid = (curr_loc_r + new_loc_r) // 2
-        c_diff_mid = (curr_loc_c + new_loc_c) // 2
-
-        return((r_diff_mid, c_diff_mid))
+        jumped = self.jumped.get((self.squares.get(curr_loc),
+                                  self.squares.get(new_loc)))
+        if jumped is None:
+            raise Exception("not a jump")
+        return self.bits.geometry.locs[jumped]
 
     def jump_piece(self, curr_loc, new_loc):
         """
@@ -499,15 +938,21 @@ class CheckerBoard(Board):
             loc (tuple): location index of piece
         Returns: None
         """
-        board = self.board
-        r_loc, c_loc = loc
-        board[r_loc][c_loc] = None
-        self.board = board
+        sq = self._square(loc)
+        if self.bits.owner(sq):
+            player = self._player(sq)
+            if self.bits.is_king(sq):
+                player.kings -= 1
+            else:
+                player.men -= 1
+        self.bits.remove(sq)
 
 class Piece: 
     '''
     Class that represents a piece
     '''
+    __slots__ = ("player",)
+
     def __init__(self, player):
         """
         Constructor
@@ -515,12 +960,33 @@ class Piece:
         self.player = player
 
 class CheckerPiece(Piece):
-    def __init__(self, player):
+    """
+    A man or king of a player. Pieces hold no position and are never
+    changed, so each Player makes one man and one king (Player.pieces) and
+    every square of the board refers to one of those four instances.
+    """
+    __slots__ = ("king", "value")
+
+    def __init__(self, player, king = False):
+        """
+        Constructor
+
+        Attributes:
+            self.value = square code of the piece (P1_MAN to P2_KING)
+        Returns: None
+        """
         self.player = player
-        self.king = False
+        self.king = king
+        self.value = (P1_MAN if player.player_num == 1 else P2_MAN) + king
 
     def king_piece(self):
-        self.king = True
+        """
+        Returns the king of the piece's player, pieces themselves are shared
+        and stay as they are
+
+        Returns: CheckerPiece
+        """
+        return self.player.pieces[1]
 
 class Player:
     """
@@ -529,10 +995,29 @@ class Player:
     def __init__(self, player_num, nrows):
         """
         Constructor
+
+        Attributes:
+            self.forward = row direction the player's men move in
+            self.king_row = row on which the player's men are kinged
+            self.pieces = the player's shared man and king CheckerPieces
+            self.men = number of the player's men on the board
+            self.kings = number of the player's kings on the board
         """
         self.player_num = player_num
         n = (nrows - 2) // 2
-        self.piece_count = n * (n+1)
+        self.men = n * (n+1)
+        self.kings = 0
+        if player_num == 1:
+            self.forward = -1
+            self.king_row = 0
+        else:
+            self.forward = 1
+            self.king_row = nrows - 1
+        self.pieces = (CheckerPiece(self), CheckerPiece(self, True))
+
+    @property
+    def piece_count(self):
+        return self.men + self.kings
 
     def __str__(self):
         return "player {}".format(self.player_num)
\ No newline at end of file
@@ -0,0 +1,324 @@
+from igl import CheckersGame
+from server import DEFAULT_HOST
+from multiprocessing import Pool
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+# Load generator for the online mode. Pairs of simulated clients connect to
+# a game server, open a game together and play random legal moves, timing
+# every move request from send to reply. By default a server is started
+# with "checkers.py serve" on a free local port, so the whole run stays on
+# this machine; --port points it at a server that is already running.
+# The pairs are split over worker processes, each running its own event
+# loop, so that the generator's own move generation does not cap the load
+# or add its queueing to the measured latencies. The CPU time of the
+# workers is reported next to the wall time to show when it still does.
+
+class _Connection:
+    """
+    One client connection. Replies are matched to requests in order and
+    events arriving in between are queued.
+    """
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.events = []
+
+    async def _read(self):
+        line = await self.reader.readline()
+        if not line:
+            raise Exception("Lost connection to the server")
+        return json.loads(line)
+
+    async def request(self, request):
+        self.writer.write((json.dumps(request) + "\n").encode())
+        while True:
+            message = await self._read()
+            if "event" in message:
+                self.events.append(message)
+            elif not message["ok"]:
+                raise Exception(message["error"])
+            else:
+                return message
+
+    async def event(self, game_id, *names):
+        """
+        Waits for an event of a game, dropping events of earlier games
+        """
+        while True:
+            event = self.events.pop(0) if self.events else await self._read()
+            if event["game"] == game_id and event["event"] in names:
+                return event
+
+    def close(self):
+        self.writer.close()
+
+class _Stats:
+    def __init__(self):
+        self.latencies = []
+        self.games = 0
+        self.active = 0
+        self.peak_active = 0
+
+async def _play(connection, game_id, player_num, nrows, rng, max_plies,
+                stats):
+    """
+    Plays one side of a game with random legal moves
+
+    Returns: None
+    """
+    game = CheckersGame(nrows)
+    clock = time.perf_counter
+    end = None
+    while end is None and len(game.undo_stack) < max_plies:
+        if game.get_curr_player().player_num == player_num:
+            move = rng.choice(game.legal_moves())
+            start = clock()
+            await connection.request({"op": "move", "game": game_id,
+                                      "path": list(move.path)})
+            stats.latencies.append(clock() - start)
+            end = game.play_move(move)
+        else:
+            event = await connection.event(game_id, "move", "end")
+            if event["event"] == "end":
+                return
+            path = tuple(event["path"])
+            move = next(m for m in game.legal_moves() if m.path == path)
+            end = game.play_move(move)
+    if end is None and player_num == 1:
+        # stop games that reach the ply limit
+        await connection.request({"op": "resign", "game": game_id})
+
+async def _pair(host, port, nrows, games, seed, max_plies, stats):
+    """
+    Two clients playing a number of games against each other
+
+    Returns: None
+    """
+    rng = random.Random(seed)
+    first = _Connection(*await asyncio.open_connection(host, port))
+    second = _Connection(*await asyncio.open_connection(host, port))
+    for _ in range(games):
+        reply = await first.request({"op": "new", "nrows": nrows})
+        game_id = reply["game"]
+        await second.request({"op": "join", "game": game_id})
+        await first.event(game_id, "start")
+        stats.active += 1
+        stats.peak_active = max(stats.peak_active, stats.active)
+        await asyncio.gather(
+            _play(first, game_id, 1, nrows, rng, max_plies, stats),
+            _play(second, game_id, 2, nrows, rng, max_plies, stats))
+        stats.active -= 1
+        stats.games += 1
+    first.close()
+    second.close()
+
+def _rss(pid):
+    """
+    Resident memory of a process in bytes, None where /proc is missing
+
+    Returns: None or int
+    """
+    try:
+        with open("/proc/{}/status".format(pid)) as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+
+def _cpu_seconds(pid):
+    """
+    User and system CPU time used by a process, None where /proc is missing
+
+    Returns: None or float
+    """
+    try:
+        with open("/proc/{}/stat".format(pid)) as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def _sample_memory(pid, samples, stop):
+    while True:
+        samples.append(_rss(pid))
+        if stop.wait(0.05):
+            return
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind((DEFAULT_HOST, 0))
+        return s.getsockname()[1]
+
+def _start_server(port):
+    """
+    Starts "checkers.py serve" and waits until it accepts connections
+
+    Returns: subprocess.Popen
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "checkers.py")
+    process = subprocess.Popen([sys.executable, script, "serve",
+                                "--port", str(port)],
+                               stdout = subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection((DEFAULT_HOST, port)).close()
+            return process
+        except OSError:
+            if time.monotonic() > deadline or process.poll() is not None:
+                process.kill()
+                raise Exception("Game server did not start")
+            time.sleep(0.05)
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def _play_pairs(host, port, seeds, games, nrows, max_plies, stats):
+    await asyncio.gather(*[_pair(host, port, nrows, games, seed, max_plies,
+                                 stats)
+                           for seed in seeds])
+
+def _run_group(job):
+    """
+    Plays a group of client pairs on the event loop of one process
+
+    Input:
+        job (tuple): host, port, seeds of the pairs, games, nrows and
+        max_plies
+
+    Returns: tuple of the move latencies, games played, peak active games
+    and CPU seconds used by the process
+    """
+    host, port, seeds, games, nrows, max_plies = job
+    stats = _Stats()
+    cpu = time.process_time()
+    asyncio.run(_play_pairs(host, port, seeds, games, nrows, max_plies,
+                            stats))
+    return (stats.latencies, stats.games, stats.peak_active,
+            time.process_time() - cpu)
+
+def _run(host, port, pid, clients, games, nrows, seed, max_plies, workers):
+    seeds = [seed + i for i in range(clients // 2)]
+    workers = max(1, min(workers or os.cpu_count(), len(seeds)))
+    jobs = [(host, port, seeds[w::workers], games, nrows, max_plies)
+            for w in range(workers)]
+    samples = []
+    baseline = _rss(pid) if pid else None
+    server_cpu = _cpu_seconds(pid) if pid else None
+    stop = threading.Event()
+    sampler = threading.Thread(target = _sample_memory,
+                               args = (pid, samples, stop)) if pid else None
+    if sampler is not None:
+        sampler.start()
+    start = time.perf_counter()
+    if workers == 1:
+        groups = [_run_group(jobs[0])]
+    else:
+        with Pool(workers) as pool:
+            groups = pool.map(_run_group, jobs)
+    elapsed = time.perf_counter() - start
+    if sampler is not None:
+        stop.set()
+        sampler.join()
+
+    ordered = sorted(latency for group in groups for latency in group[0])
+    played = sum(group[1] for group in groups)
+    # every process reaches its own peak, the sum bounds the overall one
+    peak_active = sum(group[2] for group in groups)
+    generator_cpu = sum(group[3] for group in groups)
+    result = {"clients": clients // 2 * 2, "workers": workers,
+              "games": played, "moves": len(ordered), "seconds": elapsed,
+              "moves_per_sec": len(ordered) / elapsed,
+              "latency_p50_ms": 1000 * _percentile(ordered, 0.5),
+              "latency_p99_ms": 1000 * _percentile(ordered, 0.99),
+              "generator_cpu_seconds": generator_cpu,
+              "generator_busy": generator_cpu / (elapsed * workers),
+              "server_cpu_seconds": None, "machine_busy": None,
+              "peak_active_games": peak_active,
+              "memory_per_game_bytes": None}
+    if server_cpu is not None:
+        server_cpu = _cpu_seconds(pid) - server_cpu
+        result["server_cpu_seconds"] = server_cpu
+        result["machine_busy"] = (generator_cpu + server_cpu) / \
+                                 (elapsed * os.cpu_count())
+    peak = max([s for s in samples if s is not None], default = None)
+    if baseline is not None and peak is not None and peak_active:
+        result["memory_per_game_bytes"] = (peak - baseline) / peak_active
+    return result
+
+def run(clients = 200, games = 5, nrows = 3, seed = 0, max_plies = 200,
+        host = DEFAULT_HOST, port = None, workers = 0, **kwargs):
+    """
+    Runs a load test against a game server, starting a local one if no port
+    is given. Memory per game and server CPU time are only measured for a
+    server it started. generator_busy is the share of the wall time the
+    worker processes spent on the CPU and machine_busy the share of all
+    cores used by the workers and the server together; near 1 the load is
+    limited by this machine rather than the server's design, and the
+    generator's own queueing shows up in the latencies.
+
+    Input:
+        clients (int): number of simulated clients, played in pairs
+        games (int): games every pair plays one after the other
+        nrows (int): number of rows of pieces per player
+        seed (int): seed of the first pair, pair i uses seed + i
+        max_plies (int): games reaching this many plies are resigned
+        host (str): address of the server
+        port (None or int): port of a running server
+        workers (int): processes the pairs are split over, 0 uses every
+        core
+
+    Returns: dict of results
+    """
+    process = None
+    pid = None
+    if port is None:
+        port = _free_port()
+        process = _start_server(port)
+        pid = process.pid
+    try:
+        return _run(host, port, pid, clients, games, nrows, seed, max_plies,
+                    workers)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description =
+    "Load test the online game server")
+    parser.add_argument("-c", "--clients", type = int, default = 200)
+    parser.add_argument("-N", "--games", type = int, default = 5)
+    parser.add_argument("-n", "--nrows", type = int, default = 3)
+    parser.add_argument("-s", "--seed", type = int, default = 0)
+    parser.add_argument("-m", "--max-plies", type = int, default = 200)
+    parser.add_argument("-H", "--host", type = str, default = DEFAULT_HOST)
+    parser.add_argument("-p", "--port", type = int, default = None)
+    parser.add_argument("-w", "--workers", type = int, default = 0)
+    parser.add_argument("-f", "--out", type = str)
+    args = parser.parse_args()
+    result = run(**vars(args))
+    for key, value in result.items():
+        sys.stdout.write("{}: {}\n".format(key, value))
+    if result["generator_busy"] > 0.9:
+        sys.stderr.write("warning: the load generator was CPU bound, the "
+                         "latencies include its own queueing\n")
+    elif (result["machine_busy"] or 0) > 0.9:
+        sys.stderr.write("warning: the generator and the server used every "
+                         "core, the latencies include queueing for them\n")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent = 1)
@@ -0,0 +1,309 @@
+from engine import evaluate
+from igl import CheckersGame
+from math import log, sqrt
+from multiprocessing import Pool
+from time import perf_counter
+import os
+import random
+
+class NodePool:
+    """
+    Search tree stored as parallel lists indexed by node number. Clearing
+    the pool only resets its size, so the lists grown by one search are
+    overwritten by the next instead of allocating a node object per
+    expansion. The children of a node are always stored next to each other.
+    """
+    def __init__(self):
+        """
+        Constructor
+
+        Attributes:
+            self.move = Move leading to every node, None for the root
+            self.player = number of the player who made that move
+            self.first = index of the first child, -1 until expanded
+            self.count = number of children
+            self.visits = playouts through every node
+            self.value = results of those playouts for self.player, 1 for
+            a win and 0.5 for a draw
+            self.size = nodes in use, the lists may hold more
+        Returns: None
+        """
+        self.move = []
+        self.player = []
+        self.first = []
+        self.count = []
+        self.visits = []
+        self.value = []
+        self.size = 0
+
+    def clear(self):
+        self.size = 0
+
+    def add(self, move, player):
+        """
+        Takes a node from the pool
+
+        Returns: int index of the node
+        """
+        i = self.size
+        if i < len(self.move):
+            self.move[i] = move
+            self.player[i] = player
+            self.first[i] = -1
+            self.count[i] = 0
+            self.visits[i] = 0
+            self.value[i] = 0.0
+        else:
+            self.move.append(move)
+            self.player.append(player)
+            self.first.append(-1)
+            self.count.append(0)
+            self.visits.append(0)
+            self.value.append(0.0)
+        self.size = i + 1
+        return i
+
+    def expand(self, node, moves, player):
+        """
+        Adds a child for every move of a node
+
+        Input:
+            node (int): node to expand
+            moves (list[Move]): legal moves of its position
+            player (int): number of the player to move there
+
+        Returns: None
+        """
+        self.first[node] = self.size
+        self.count[node] = len(moves)
+        for move in moves:
+            self.add(move, player)
+
+class MCTSEngine:
+    """
+    Monte Carlo tree search over a CheckersGame with UCT selection. The tree
+    is walked with make_move/unmake_move and playouts are played straight
+    on the BitBoard, so no position is copied. With several workers every
+    process searches its own tree from the root and the visit counts of the
+    root moves are added up (root parallelism). Positions in the opening
+    book are answered from the book without searching.
+    """
+    def __init__(self, exploration = 1.4, rollout = "random",
+                 rollout_plies = 80, workers = 1, seed = None, book = None):
+        """
+        Constructor
+
+        Args:
+            exploration (float): UCT exploration constant
+            rollout (str): "random" plays uniformly random moves, "jumps"
+            plays a random capture whenever there is one
+            rollout_plies (int): playouts stopped after this many plies are
+            scored by material
+            workers (int): number of processes, 0 uses every core
+            seed (None or int): seed of the random playouts
+            book (None or OpeningBook): opening book played from without
+            searching
+
+        Attributes:
+            self.book = OpeningBook or None
+            self.pool = NodePool reused by every search
+            self.playouts = playouts of the last search, over all workers
+            self.nodes = nodes of the tree of the last search
+        Returns: None
+        """
+        if rollout not in ("random", "jumps"):
+            raise Exception("Unknown rollout policy {}".format(rollout))
+        self.exploration = exploration
+        self.rollout = rollout
+        self.rollout_plies = rollout_plies
+        self.workers = workers or os.cpu_count()
+        self.rng = random.Random(seed)
+        self.book = book
+        self.pool = NodePool()
+        self.process_pool = None
+        self.playouts = 0
+        self.nodes = 0
+
+    def search(self, game, time_limit = 1.0, playouts = None):
+        """
+        Finds the most visited move for the current player, or the book
+        move while the game is in the opening book
+
+        Input:
+            game (CheckersGame): game to search, restored before returning
+            time_limit (float): wall-clock budget in seconds
+            playouts (None or int): stops after this many playouts, summed
+            over all workers
+
+        Returns: Move or None if the current player cannot move
+        """
+        moves = game.legal_moves()
+        if not moves:
+            return None
+        self.playouts = 0
+        self.nodes = 0
+        if len(moves) == 1:
+            return moves[0]
+        if self.book is not None:
+            move = self.book.choose(game)
+            if move is not None:
+                return move
+        if self.workers == 1:
+            stats = self._search(game, time_limit, playouts)
+        else:
+            stats = self._parallel_search(game, time_limit, playouts)
+        best = max(stats, key = lambda s: s[1])
+        return next(move for move in moves if move.path == best[0])
+
+    def _parallel_search(self, game, time_limit, playouts):
+        if self.process_pool is None:
+            self.process_pool = Pool(self.workers)
+        share = None if playouts is None else -(-playouts // self.workers)
+        settings = (self.exploration, self.rollout, self.rollout_plies)
+        snapshot = game.snapshot()
+        jobs = [(settings, snapshot, time_limit, share,
+                 self.rng.getrandbits(64)) for _ in range(self.workers)]
+        totals = {}
+        self.playouts = 0
+        self.nodes = 0
+        for stats, nplayouts, nodes in self.process_pool.map(_search_job,
+                                                             jobs):
+            self.playouts += nplayouts
+            self.nodes += nodes
+            for path, visits, value in stats:
+                total = totals.setdefault(path, [0, 0.0])
+                total[0] += visits
+                total[1] += value
+        return [(path, visits, value) for path, (visits, value)
+                in totals.items()]
+
+    def close(self):
+        """
+        Stops the worker processes, if any were started
+        """
+        if self.process_pool is not None:
+            self.process_pool.terminate()
+            self.process_pool = None
+
+    def _search(self, game, time_limit, playouts):
+        """
+        Grows a tree from the current position in this process
+
+        Returns: list[tuple] of (path, visits, value) for every root move
+        """
+        pool = self.pool
+        pool.clear()
+        root = pool.add(None, 0)
+        bits = game.board.bits
+        deadline = perf_counter() + time_limit
+        self.playouts = 0
+        path = []
+        while playouts is None or self.playouts < playouts:
+            if perf_counter() > deadline:
+                break
+            node = root
+            path.append(node)
+            while pool.first[node] >= 0 and pool.count[node]:
+                node = self._select(node)
+                game.make_move(pool.move[node])
+                path.append(node)
+            # leaves are expanded on their second visit, the first playout
+            # runs from the leaf itself
+            if pool.first[node] < 0 and (pool.visits[node] or node == root):
+                player_num = game.get_curr_player().player_num
+                pool.expand(node, game.legal_moves(), player_num)
+                if pool.count[node]:
+                    node = pool.first[node] + \
+                        self.rng.randrange(pool.count[node])
+                    game.make_move(pool.move[node])
+                    path.append(node)
+            winner = self._playout(bits, game.get_curr_player().player_num)
+            for node in path:
+                pool.visits[node] += 1
+                if winner == pool.player[node]:
+                    pool.value[node] += 1.0
+                elif winner == 0:
+                    pool.value[node] += 0.5
+            for _ in range(len(path) - 1):
+                game.unmake_move()
+            path.clear()
+            self.playouts += 1
+        self.nodes = pool.size
+        first = pool.first[root]
+        return [(pool.move[i].path, pool.visits[i], pool.value[i])
+                for i in range(first, first + pool.count[root])]
+
+    def _select(self, node):
+        """
+        Picks the child of a node with the best UCT score, unvisited
+        children first
+
+        Returns: int
+        """
+        pool = self.pool
+        visits = pool.visits
+        value = pool.value
+        c = self.exploration * sqrt(log(visits[node]))
+        best = -1
+        best_score = -1.0
+        first = pool.first[node]
+        for child in range(first, first + pool.count[node]):
+            n = visits[child]
+            if n == 0:
+                return child
+            score = value[child] / n + c / sqrt(n)
+            if score > best_score:
+                best = child
+                best_score = score
+        return best
+
+    def _playout(self, bits, player_num):
+        """
+        Plays random moves from a position and takes them all back
+
+        Input:
+            bits (BitBoard): position to play from
+            player_num (int): number of the player to move
+
+        Returns: int number of the winner, 0 for a draw
+        """
+        rng = self.rng
+        jumps_first = self.rollout == "jumps"
+        played = []
+        winner = None
+        for _ in range(self.rollout_plies):
+            moves = bits.legal_moves(player_num)
+            if not moves:
+                winner = 3 - player_num if bits.can_move(3 - player_num) else 0
+                break
+            if jumps_first and moves[0].captures:
+                # legal_moves lists the jumps first
+                njumps = 1
+                while njumps < len(moves) and moves[njumps].captures:
+                    njumps += 1
+                move = moves[rng.randrange(njumps)]
+            else:
+                move = moves[rng.randrange(len(moves))]
+            played.append((move, player_num, bits.apply(move, player_num)))
+            player_num = 3 - player_num
+        if winner is None:
+            score = evaluate(bits, 1)
+            winner = 1 if score > 0 else 2 if score < 0 else 0
+        for move, player_num, token in reversed(played):
+            bits.undo(move, player_num, token)
+        return winner
+
+# engines are kept per worker process so their node pools are reused from
+# one search to the next
+_worker_engines = {}
+
+def _search_job(job):
+    settings, snapshot, time_limit, playouts, seed = job
+    engine = _worker_engines.get(settings)
+    if engine is None:
+        engine = MCTSEngine(*settings)
+        _worker_engines[settings] = engine
+    engine.rng.seed(seed)
+    game = CheckersGame.from_snapshot(snapshot)
+    stats = engine._search(game, time_limit, playouts)
+    return stats, engine.playouts, engine.nodes
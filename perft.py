@@ -0,0 +1,62 @@
+from igl import CheckersGame
+from multiprocessing import Pool
+import os
+
+def perft(game, depth, bulk = True):
+    """
+    Counts the leaf nodes of the legal move tree of a position. The game is
+    walked with make_move and unmake_move and left as it was found.
+
+    Input:
+        game (CheckersGame): position to count from
+        depth (int): number of plies
+        bulk (bool): count the moves of the last ply without playing them
+
+    Returns: int
+    """
+    if depth == 0:
+        return 1
+    moves = game.legal_moves()
+    if bulk and depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        game.make_move(move)
+        nodes += perft(game, depth - 1, bulk)
+        game.unmake_move()
+    return nodes
+
+def _divide_job(job):
+    snapshot, move, depth, bulk = job
+    game = CheckersGame.from_snapshot(snapshot)
+    game.make_move(move)
+    return perft(game, depth, bulk)
+
+def divide(game, depth, bulk = True, workers = 1):
+    """
+    Counts the leaf nodes below every root move. With several workers the
+    root moves are shared out across a process pool.
+
+    Input:
+        game (CheckersGame): position to count from
+        depth (int): number of plies, at least 1
+        bulk (bool): count the moves of the last ply without playing them
+        workers (int): number of processes, 0 uses every core
+
+    Returns: list[tuple] of (Move, int) in legal_moves order
+    """
+    if depth < 1:
+        raise Exception("Divide needs a depth of at least 1")
+    moves = game.legal_moves()
+    if workers == 1:
+        counts = []
+        for move in moves:
+            game.make_move(move)
+            counts.append(perft(game, depth - 1, bulk))
+            game.unmake_move()
+    else:
+        snapshot = game.snapshot()
+        jobs = [(snapshot, move, depth - 1, bulk) for move in moves]
+        with Pool(workers or os.cpu_count()) as pool:
+            counts = pool.map(_divide_job, jobs)
+    return list(zip(moves, counts))
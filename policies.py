@@ -0,0 +1,105 @@
+from engine import SearchEngine, evaluate
+from mcts import MCTSEngine
+
+class RandomPolicy:
+    """
+    Plays a uniformly random legal move
+    """
+    def new_game(self):
+        """
+        Called before every game the policy plays
+        """
+        pass
+
+    def choose(self, game, rng):
+        """
+        Picks a move for the current player
+
+        Input:
+            game (CheckersGame): game to move in
+            rng (random.Random): source of randomness
+
+        Returns: Move or None if the current player cannot move
+        """
+        moves = game.legal_moves()
+        if not moves:
+            return None
+        return rng.choice(moves)
+
+class GreedyPolicy(RandomPolicy):
+    """
+    Plays the move with the best material balance right after it is made,
+    breaking ties at random
+    """
+    def choose(self, game, rng):
+        moves = game.legal_moves()
+        if not moves:
+            return None
+        player_num = game.get_curr_player().player_num
+        bits = game.board.bits
+        best_score = None
+        best_moves = []
+        for move in moves:
+            game.make_move(move)
+            score = evaluate(bits, player_num)
+            game.unmake_move()
+            if best_score is None or score > best_score:
+                best_score = score
+                best_moves = [move]
+            elif score == best_score:
+                best_moves.append(move)
+        return rng.choice(best_moves)
+
+class SearchPolicy(RandomPolicy):
+    """
+    Plays the move found by a SearchEngine, or the opening book move while
+    the game is in the book. With the default unlimited time the search
+    stops at max_depth, so games are reproducible.
+    """
+    def __init__(self, max_depth = 4, time_limit = 3600.0, book = None):
+        self.engine = SearchEngine(max_depth, book = book)
+        self.time_limit = time_limit
+
+    def new_game(self):
+        """
+        Empties the transposition table so a game does not depend on the
+        games played before it
+        """
+        self.engine.table.clear()
+
+    def choose(self, game, rng):
+        return self.engine.search(game, self.time_limit)
+
+class MCTSPolicy(RandomPolicy):
+    """
+    Plays the move found by an MCTSEngine, or the opening book move while
+    the game is in the book. The search stops after a fixed number of
+    playouts seeded from the game's random source, so games are
+    reproducible.
+    """
+    def __init__(self, playouts = 1000, rollout = "random", book = None):
+        self.engine = MCTSEngine(rollout = rollout, book = book)
+        self.playouts = playouts
+
+    def choose(self, game, rng):
+        self.engine.rng.seed(rng.getrandbits(64))
+        return self.engine.search(game, 3600.0, self.playouts)
+
+POLICIES = {"random": RandomPolicy, "greedy": GreedyPolicy,
+            "search": SearchPolicy, "mcts": MCTSPolicy}
+
+def make_policy(name, **kwargs):
+    """
+    Creates a policy from its name
+
+    Input:
+        name (str): one of POLICIES
+        kwargs: options passed to the policy constructor
+
+    Returns: policy object
+    """
+    try:
+        policy_class = POLICIES[name]
+    except KeyError:
+        raise Exception("Unknown policy {}".format(name))
+    return policy_class(**kwargs)
@@ -0,0 +1,314 @@
+from bitboard import BitBoard, Move
+from igl import DRAW_PLIES, REPETITIONS
+from collections import namedtuple
+import re
+import struct
+
+MAGIC = b"CKRD"
+VERSION = 2
+
+# rules flags stored in the file header
+RULE_OPTIONAL_JUMPS = 1
+RULE_STOP_MID_JUMP = 2
+RULES = RULE_OPTIONAL_JUMPS | RULE_STOP_MID_JUMP
+
+# game results
+RESULT_NONE = 0
+RESULT_P1 = 1
+RESULT_P2 = 2
+RESULT_DRAW = 3
+
+_FILE_HEADER = struct.Struct("<4sBHHBB")
+_DRAW_RULES = struct.Struct("<HB")
+_GAME_HEADER = struct.Struct("<IBI")
+
+GameRecord = namedtuple("GameRecord", ["nrows", "ncols", "result", "moves",
+                                       "draw_plies", "repetitions"],
+                        defaults = (None, None))
+GameRecord.__doc__ = """
+A recorded game: board size, one of the RESULT_ codes and the list of
+Moves played, given as BitBoard squares. draw_plies and repetitions are the
+draw rules the game was played with (see CheckersGame), None for records
+made before they were stored.
+"""
+
+# Binary game archive layout, all integers little endian:
+#
+#     file header: magic "CKRD", version (u8), nrows (u16), ncols (u16),
+#                  rules flags (u8), bytes per square (u8), then from
+#                  version 2 on the draw rules: plies without a capture or
+#                  man move (u16) and repetitions (u8), 0 for no limit
+#     then for every game:
+#         game header: payload length in bytes (u32), result (u8),
+#                      number of moves (u32)
+#         payload: for every move one byte (landings << 1 | is_jump)
+#                  followed by the start square and every landing square
+#
+# Captured squares are not stored, they are the midpoints of each jump. The
+# length prefix lets readers skip a game without decoding it.
+
+def result_code(end, winner):
+    """
+    Converts the outcome of a game into a RESULT_ code
+
+    Input:
+        end (None or str): value returned by end_turn or play_move
+        winner (int): number of the winning player, 0 if none
+
+    Returns: int
+    """
+    if end == "winner":
+        return winner
+    if end == "draw":
+        return RESULT_DRAW
+    return RESULT_NONE
+
+def draw_rules(record, draw_plies = DRAW_PLIES, repetitions = REPETITIONS):
+    """
+    Draw rules a recorded game was played with, falling back to the given
+    ones for records that do not store them
+
+    Input:
+        record (GameRecord): recorded game
+        draw_plies (int): rule used if the record has none
+        repetitions (int): rule used if the record has none
+
+    Returns: tuple (draw_plies, repetitions) as CheckersGame takes them
+    """
+    if record.draw_plies is not None:
+        draw_plies = record.draw_plies
+    if record.repetitions is not None:
+        repetitions = record.repetitions
+    return draw_plies, repetitions
+
+def move_from_path(path, ncols):
+    """
+    Rebuilds a Move from its path of squares alone. A single step is a jump
+    when it covers two diagonal squares instead of one.
+
+    Input:
+        path (list[int]): start square followed by every landing square
+        ncols (int): number of columns of the board
+
+    Returns: Move
+    """
+    path = tuple(path)
+    step = abs(path[1] - path[0])
+    if len(path) == 2 and step in (ncols // 2, ncols // 2 + 1):
+        return Move(path, ())
+    return Move(path, _jump_captures(path))
+
+def _square_format(nrows, ncols):
+    if nrows * (ncols + 1) // 2 <= 256:
+        return 1, "B"
+    return 2, "H"
+
+class RecordWriter:
+    """
+    Appends games to a binary archive one at a time, so archives of any
+    size are written without holding them in memory
+    """
+    def __init__(self, f, nrows, ncols, draw_plies = DRAW_PLIES,
+                 repetitions = REPETITIONS):
+        """
+        Constructor
+
+        Args:
+            f (file): binary file opened for writing
+            nrows (int): number of rows of the board
+            ncols (int): number of columns of the board
+            draw_plies (int): draw rule every game was played with
+            repetitions (int): draw rule every game was played with
+
+        Returns: None
+        """
+        self.f = f
+        self.nrows = nrows
+        self.ncols = ncols
+        square_size, self.square_code = _square_format(nrows, ncols)
+        f.write(_FILE_HEADER.pack(MAGIC, VERSION, nrows, ncols, RULES,
+                                  square_size))
+        f.write(_DRAW_RULES.pack(draw_plies, repetitions))
+
+    def write_game(self, moves, result = RESULT_NONE):
+        """
+        Appends one game
+
+        Input:
+            moves (list[Move]): moves in the order they were played
+            result (int): RESULT_ code of the game
+
+        Returns: None
+        """
+        payload = bytearray()
+        wide = self.square_code == "H"
+        for move in moves:
+            path = move.path
+            payload.append((len(path) - 1) << 1 | bool(move.captures))
+            if wide:
+                payload += struct.pack("<{}H".format(len(path)), *path)
+            else:
+                payload += bytes(path)
+        self.f.write(_GAME_HEADER.pack(len(payload), result, len(moves)))
+        self.f.write(payload)
+
+def _jump_captures(path):
+    return tuple((a + b) // 2 for a, b in zip(path, path[1:]))
+
+def read_games(f, decode_moves = True):
+    """
+    Iterates over the games of a binary archive, reading one game at a time
+
+    Input:
+        f (file): binary file opened for reading
+        decode_moves (bool): if False the moves of every game are skipped
+        and GameRecord.moves is None
+
+    Returns: generator[GameRecord]
+    """
+    header = f.read(_FILE_HEADER.size)
+    if len(header) < _FILE_HEADER.size:
+        raise Exception("Not a game archive")
+    magic, version, nrows, ncols, _, square_size = _FILE_HEADER.unpack(header)
+    if magic != MAGIC or version not in (1, VERSION):
+        raise Exception("Not a game archive")
+    two_byte = square_size == 2
+    draw_plies = repetitions = None
+    if version >= 2:
+        rules = f.read(_DRAW_RULES.size)
+        if len(rules) < _DRAW_RULES.size:
+            raise Exception("Truncated game archive")
+        draw_plies, repetitions = _DRAW_RULES.unpack(rules)
+
+    while True:
+        game_header = f.read(_GAME_HEADER.size)
+        if not game_header:
+            return
+        if len(game_header) < _GAME_HEADER.size:
+            raise Exception("Truncated game archive")
+        length, result, nmoves = _GAME_HEADER.unpack(game_header)
+        if not decode_moves:
+            f.seek(length, 1)
+            yield GameRecord(nrows, ncols, result, None, draw_plies,
+                             repetitions)
+            continue
+        payload = f.read(length)
+        if len(payload) < length:
+            raise Exception("Truncated game archive")
+        if two_byte:
+            moves = _decode_wide(payload, nmoves)
+        else:
+            moves = _decode(payload, nmoves)
+        yield GameRecord(nrows, ncols, result, moves, draw_plies,
+                         repetitions)
+
+def _decode(payload, nmoves):
+    moves = []
+    i = 0
+    for _ in range(nmoves):
+        code = payload[i]
+        end = i + 2 + (code >> 1)
+        path = tuple(payload[i + 1:end])
+        moves.append(Move(path, _jump_captures(path) if code & 1 else ()))
+        i = end
+    return moves
+
+def _decode_wide(payload, nmoves):
+    moves = []
+    i = 0
+    for _ in range(nmoves):
+        code = payload[i]
+        nsquares = 1 + (code >> 1)
+        path = struct.unpack_from("<{}H".format(nsquares), payload, i + 1)
+        moves.append(Move(path, _jump_captures(path) if code & 1 else ()))
+        i += 1 + 2 * nsquares
+    return moves
+
+_PDN_RESULTS = {RESULT_P1: "1-0", RESULT_P2: "0-1", RESULT_DRAW: "1/2-1/2",
+                RESULT_NONE: "*"}
+
+def _pdn_numbers(nrows, ncols):
+    """
+    Maps BitBoard squares to PDN square numbers. Squares are numbered from 1
+    starting at player 1's back row, so the first player's men start on the
+    lowest numbers as in standard notation.
+
+    Returns: dict
+    """
+    bits = BitBoard(nrows, ncols)
+    numbers = {}
+    for r in range(nrows):
+        for c in range(ncols):
+            sq = bits.square((nrows - 1 - r, ncols - 1 - c))
+            if sq is not None:
+                numbers[sq] = len(numbers) + 1
+    return numbers
+
+def to_pdn(record):
+    """
+    Writes a game in Portable Draughts Notation
+
+    Input:
+        record (GameRecord): game to write
+
+    Returns: str
+    """
+    numbers = _pdn_numbers(record.nrows, record.ncols)
+    result = _PDN_RESULTS[record.result]
+    tokens = []
+    for i, move in enumerate(record.moves):
+        if i % 2 == 0:
+            tokens.append("{}.".format(i // 2 + 1))
+        sep = "x" if move.captures else "-"
+        tokens.append(sep.join(str(numbers[sq]) for sq in move.path))
+    tokens.append(result)
+    lines = ['[BoardSize "{}x{}"]'.format(record.nrows, record.ncols),
+             '[Result "{}"]'.format(result)]
+    if record.draw_plies is not None:
+        lines.append('[DrawPlies "{}"]'.format(record.draw_plies))
+    if record.repetitions is not None:
+        lines.append('[Repetitions "{}"]'.format(record.repetitions))
+    lines.append("")
+    line = ""
+    for token in tokens:
+        if len(line) + len(token) >= 80:
+            lines.append(line.rstrip())
+            line = ""
+        line += token + " "
+    lines.append(line.rstrip())
+    return "\n".join(lines) + "\n"
+
+def from_pdn(text):
+    """
+    Reads a game written by to_pdn. Boards without a BoardSize tag are taken
+    to be 8x8, games without DrawPlies or Repetitions tags do not record
+    their draw rules.
+
+    Input:
+        text (str): PDN text of one game
+
+    Returns: GameRecord
+    """
+    size = re.search(r'\[BoardSize "(\d+)x(\d+)"\]', text)
+    nrows, ncols = (int(size.group(1)), int(size.group(2))) if size else (8, 8)
+    squares = {n: sq for sq, n in _pdn_numbers(nrows, ncols).items()}
+    results = {v: k for k, v in _PDN_RESULTS.items()}
+    body = re.sub(r"\[[^\]]*\]|\{[^}]*\}", " ", text)
+    result = RESULT_NONE
+    moves = []
+    for token in body.split():
+        if token in results:
+            result = results[token]
+        elif re.fullmatch(r"\d+\.", token):
+            continue
+        elif re.fullmatch(r"\d+([-x]\d+)+", token):
+            path = tuple(squares[int(n)] for n in re.split("[-x]", token))
+            captures = _jump_captures(path) if "x" in token else ()
+            moves.append(Move(path, captures))
+        else:
+            raise Exception("Invalid PDN token {}".format(token))
+    rules = [re.search(r'\[{} "(\d+)"\]'.format(tag), text)
+             for tag in ("DrawPlies", "Repetitions")]
+    draw_plies, repetitions = [int(rule.group(1)) if rule else None
+                               for rule in rules]
+    return GameRecord(nrows, ncols, result, moves, draw_plies, repetitions)
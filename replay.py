@@ -0,0 +1,155 @@
+from igl import CheckersGame, DRAW_PLIES, REPETITIONS
+from records import (GameRecord, MAGIC, RESULT_NONE, draw_rules, from_pdn,
+                     move_from_path, read_games, result_code)
+import io
+import json
+import time
+
+# Replays recorded games through the same calls the TUI makes for a human
+# turn (check_loc, get_possible_moves/jumps, complete_turn, end_turn), so
+# changes to the rules can be checked against archived games at full
+# speed. Every move must be one of the options the game offers and the
+# game must end where, and how, the record says it did.
+
+def read_records(f, nrows = 3):
+    """
+    Reads the games of a binary archive, a file of JSON lines written by
+    selfplay.py or PDN text, one game at a time. The format is found by
+    peeking at the first bytes. PDN text without a BoardSize tag is taken
+    to be played on the board of nrows.
+
+    Input:
+        f (file): buffered binary file opened for reading, such as
+        sys.stdin.buffer
+        nrows (int): number of rows of pieces per player for bare PDN moves
+
+    Returns: generator[GameRecord]
+    """
+    if f.peek(len(MAGIC)).startswith(MAGIC):
+        yield from read_games(f)
+        return
+    lines = io.TextIOWrapper(f, encoding = "utf-8")
+    try:
+        for line in lines:
+            if line.strip():
+                break
+        else:
+            return
+        if line.lstrip().startswith("{"):
+            while True:
+                if line.strip():
+                    yield _json_record(line)
+                line = next(lines, None)
+                if line is None:
+                    return
+        # a PDN game runs until the BoardSize tag of the next one
+        game = [line]
+        for line in lines:
+            if line.lstrip().startswith("[BoardSize") and \
+               any(text.strip() for text in game):
+                yield _pdn_record(game, nrows)
+                game = []
+            game.append(line)
+        yield _pdn_record(game, nrows)
+    finally:
+        # leaves f open for the caller
+        lines.detach()
+
+def _json_record(line):
+    record = json.loads(line)
+    ncols = 2 * record["nrows"] + 2
+    moves = [move_from_path(path, ncols) for path in record["moves"]]
+    return GameRecord(ncols, ncols, result_code(record["result"],
+                      record["winner"]), moves, record.get("draw_plies"),
+                      record.get("repetitions"))
+
+def _pdn_record(lines, nrows):
+    game = "".join(lines)
+    if "[BoardSize" not in game:
+        size = 2 * nrows + 2
+        game = '[BoardSize "{0}x{0}"]\n{1}'.format(size, game)
+    return from_pdn(game)
+
+def _option(game, move):
+    """
+    Finds the TUI option that plays a move
+
+    Input:
+        game (CheckersGame): game to move in
+        move (Move): recorded move
+
+    Returns: tuple of the option number, the piece location and both option
+    lists as complete_turn takes them
+    """
+    bits = game.board.bits
+    loc = bits.loc(move.path[0])
+    game.board.check_loc(loc, game.get_curr_player())
+    game.board.check_for_piece(loc)
+    possible_moves = [game.de_tuple_loc(x)
+                      for x in game.get_possible_moves(loc)]
+    possible_jumps = game.get_possible_jumps(loc)
+    if move.captures:
+        paths = [jump.path for jump in possible_jumps]
+        if move.path in paths:
+            return (len(possible_moves) + paths.index(move.path) + 1, loc,
+                    possible_moves, possible_jumps)
+    elif len(move.path) == 2:
+        target = game.de_tuple_loc(bits.loc(move.path[1]))
+        if target in possible_moves:
+            return (possible_moves.index(target) + 1, loc, possible_moves,
+                    possible_jumps)
+    raise Exception("not one of the options")
+
+def replay_game(record, times = None, draw_plies = DRAW_PLIES,
+                repetitions = REPETITIONS):
+    """
+    Plays a recorded game move by move, stopping at the first move that
+    is not legal. The game is played with the draw rules stored in the
+    record, or the given ones for records that do not store them.
+
+    Input:
+        record (GameRecord): game to replay
+        times (None or list): seconds taken by every move are appended
+        draw_plies (int): draw rule of the game, see CheckersGame
+        repetitions (int): draw rule of the game, see CheckersGame
+
+    Returns: dict with the number of plies played, the final turn, piece
+    counts and position hash, the RESULT_ code reached and the error found,
+    None if the replay matched the record
+    """
+    if record.nrows != record.ncols or record.nrows % 2:
+        raise Exception("Unsupported board size {}x{}".format(record.nrows,
+                        record.ncols))
+    game = CheckersGame((record.nrows - 2) // 2,
+                        *draw_rules(record, draw_plies, repetitions))
+    clock = time.perf_counter
+    end = None
+    error = None
+    plies = 0
+    for move in record.moves:
+        if end:
+            error = "move {} played after the game ended".format(plies + 1)
+            break
+        start = clock()
+        try:
+            choice, loc, possible_moves, possible_jumps = _option(game, move)
+        except Exception as e:
+            error = "move {} ({}) is illegal: {}".format(plies + 1,
+                    game.describe_move(move), e)
+            break
+        end_loc = game.complete_turn(choice, loc, possible_moves,
+                                     possible_jumps)
+        end = game.end_turn(end_loc)
+        if times is not None:
+            times.append(clock() - start)
+        plies += 1
+
+    winner = game.get_other_player().player_num if end == "winner" else 0
+    result = result_code(end, winner)
+    if error is None and record.result not in (RESULT_NONE, result):
+        error = "recorded result {} but the game gave {}".format(
+                record.result, result)
+    bits = game.board.bits
+    return {"plies": plies, "turn": game.turn, "p1": bits.count(1),
+            "p2": bits.count(2), "hash": game.position_hash(),
+            "result": result, "error": error}
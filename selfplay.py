@@ -0,0 +1,126 @@
+from igl import CheckersGame, DRAW_PLIES, REPETITIONS
+from book import OpeningBook
+from policies import make_policy
+from records import RecordWriter, move_from_path, result_code
+from multiprocessing import Pool
+import argparse
+import json
+import os
+import random
+import sys
+
+# policies are kept per worker process so engines, their tables and
+# opening books are built once rather than for every game
+_policy_cache = {}
+_random_policy = make_policy("random")
+
+def _get_policy(name, depth, book):
+    key = (name, depth, book)
+    if key not in _policy_cache:
+        if name == "search":
+            _policy_cache[key] = make_policy(name, max_depth = depth,
+            book = OpeningBook(book) if book else None)
+        elif name == "mcts":
+            _policy_cache[key] = make_policy(name,
+            book = OpeningBook(book) if book else None)
+        else:
+            _policy_cache[key] = make_policy(name)
+    return _policy_cache[key]
+
+def play_game(job):
+    """
+    Plays one headless game between two policies
+
+    Input:
+        job (dict): game number, seed, nrows, policy names, search depth,
+        opening book file, number of random opening plies, ply limit and
+        draw rules
+
+    Returns: dict describing the finished game
+    """
+    rng = random.Random(job["seed"])
+    game = CheckersGame(job["nrows"], job["draw_plies"], job["repetitions"])
+    policies = {1: _get_policy(job["p1"], job["depth"], job["book"]),
+                2: _get_policy(job["p2"], job["depth"], job["book"])}
+    for policy in policies.values():
+        policy.new_game()
+    moves = []
+    end = None
+    while end is None and len(moves) < job["max_plies"]:
+        player_num = game.get_curr_player().player_num
+        if len(moves) < job["opening"]:
+            # random openings keep deterministic policies from replaying
+            # the same game for every seed
+            move = _random_policy.choose(game, rng)
+        else:
+            move = policies[player_num].choose(game, rng)
+        if move is None:
+            break
+        moves.append(list(move.path))
+        end = game.play_move(move)
+
+    if end == "winner":
+        winner = game.get_other_player().player_num
+    else:
+        winner = 0
+    return {"game": job["game"], "seed": job["seed"], "nrows": job["nrows"],
+            "p1": job["p1"], "p2": job["p2"], "winner": winner,
+            "result": end or "limit", "plies": len(moves),
+            "draw_plies": job["draw_plies"],
+            "repetitions": job["repetitions"], "moves": moves}
+
+def run(games, nrows, p1, p2, workers, seed, out, depth, opening, max_plies,
+        format, book, draw_plies = DRAW_PLIES, repetitions = REPETITIONS,
+        **kwargs):
+    """
+    Plays games across a process pool and writes each one to the output
+    file as soon as it finishes, either appended as a JSON line or as a
+    record of a new binary archive (see records.py)
+
+    Returns: dict of win counts
+    """
+    jobs = [{"game": i, "seed": seed + i, "nrows": nrows, "p1": p1, "p2": p2,
+             "depth": depth, "book": book, "opening": opening,
+             "max_plies": max_plies, "draw_plies": draw_plies,
+             "repetitions": repetitions}
+            for i in range(games)]
+    totals = {0: 0, 1: 0, 2: 0}
+    binary = format == "binary"
+    with open(out, "wb" if binary else "a") as f, \
+    Pool(workers or os.cpu_count()) as pool:
+        if binary:
+            ncols = 2 * nrows + 2
+            writer = RecordWriter(f, ncols, ncols, draw_plies, repetitions)
+        for record in pool.imap_unordered(play_game, jobs):
+            if binary:
+                moves = [move_from_path(path, ncols) for path in record["moves"]]
+                writer.write_game(moves, result_code(record["result"],
+                record["winner"]))
+            else:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            totals[record["winner"]] += 1
+    sys.stdout.write("player 1: {} player 2: {} draws: {}\n".format(
+        totals[1], totals[2], totals[0]))
+    return totals
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Headless checkers self-play")
+    parser.set_defaults(method = run)
+    parser.add_argument("-N", "--games", type = int, default = 100)
+    parser.add_argument("-n", "--nrows", type = int, default = 3)
+    parser.add_argument("--p1", type = str, default = "random")
+    parser.add_argument("--p2", type = str, default = "random")
+    parser.add_argument("-w", "--workers", type = int, default = 0)
+    parser.add_argument("-s", "--seed", type = int, default = 0)
+    parser.add_argument("-f", "--out", type = str, default = "selfplay.jsonl")
+    parser.add_argument("--format", type = str, choices = ["json", "binary"],
+                        default = "json")
+    parser.add_argument("-d", "--depth", type = int, default = 4)
+    parser.add_argument("-b", "--book", type = str, default = None)
+    parser.add_argument("-r", "--opening", type = int, default = 4)
+    parser.add_argument("-m", "--max-plies", type = int, default = 300)
+    parser.add_argument("--draw-plies", type = int, default = DRAW_PLIES)
+    parser.add_argument("--repetitions", type = int, default = REPETITIONS)
+    args = parser.parse_args()
+    args.method(**vars(args))
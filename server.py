@@ -0,0 +1,298 @@
+from igl import CheckersGame
+from collections import deque
+from itertools import count
+import argparse
+import asyncio
+import json
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 7373
+MAX_NROWS = 20
+
+# Protocol: every message is one JSON object on its own line.
+#
+#     client requests ("id" is optional and echoed back in the reply):
+#         {"op": "match", "nrows": n}          join the oldest open game of
+#                                              that size or open a new one
+#         {"op": "new", "nrows": n}            open a game joined by id only
+#         {"op": "join", "game": g}            join an open game
+#         {"op": "move", "game": g, "path": [squares]}
+#         {"op": "state", "game": g}
+#         {"op": "resign", "game": g}
+#     replies: {"ok": true, ...} or {"ok": false, "error": message}
+#     events pushed to players:
+#         {"event": "start", "game": g, "player": p, "nrows": n}
+#         {"event": "move", "game": g, "path": [squares], "end": end,
+#          "winner": w}
+#         {"event": "end", "game": g, "winner": w, "reason": reason}
+#
+# Squares are BitBoard squares, so a move is the path of its Move. end is
+# null, "draw" or "winner" as returned by CheckersGame.play_move and winner
+# is the number of the winning player, 0 if none.
+
+class ServerGame:
+    """
+    A hosted game: the rules state and the client playing each side
+    """
+    __slots__ = ("game_id", "nrows", "game", "players")
+
+    def __init__(self, game_id, nrows):
+        self.game_id = game_id
+        self.nrows = nrows
+        self.game = CheckersGame(nrows)
+        self.players = {1: None, 2: None}
+
+class _Client:
+    """
+    A connection and the games it plays in, keyed by game id
+    """
+    __slots__ = ("writer", "games")
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.games = {}
+
+class GameServer:
+    """
+    Hosts any number of games for clients connected over TCP. Everything
+    runs on one asyncio event loop; validating and playing a move takes
+    microseconds, so it is done inline.
+    """
+    def __init__(self, host = DEFAULT_HOST, port = DEFAULT_PORT):
+        """
+        Constructor
+
+        Args:
+            host (str): address to listen on
+            port (int): port to listen on, 0 picks a free port
+
+        Attributes:
+            self.games = games in progress or waiting for a player, by id
+            self.open_games = ids of matchable games waiting for a second
+            player, per nrows
+        Returns: None
+        """
+        self.host = host
+        self.port = port
+        self.games = {}
+        self.open_games = {}
+        self.ids = count(1)
+        self.server = None
+        self.ops = {"match": self._match, "new": self._new,
+                    "join": self._join, "move": self._move,
+                    "state": self._state, "resign": self._resign}
+
+    async def start(self):
+        """
+        Starts listening. The port actually bound is stored in self.port.
+
+        Returns: None
+        """
+        self.server = await asyncio.start_server(self._handle, self.host,
+                                                 self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        client = _Client(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write(self._dispatch(client, line))
+                await writer.drain()
+        except (ConnectionError, ValueError, asyncio.LimitOverrunError):
+            # a dropped connection, or a line over the stream limit, which
+            # leaves no request boundary to resume from
+            pass
+        finally:
+            for game_id in list(client.games):
+                self._leave(client, game_id, "disconnect")
+            writer.close()
+
+    def _dispatch(self, client, line):
+        """
+        Runs one request and encodes its reply
+
+        Returns: bytes
+        """
+        request = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise Exception("invalid request")
+            op = self.ops.get(request.get("op"))
+            if op is None:
+                raise Exception("unknown op")
+            reply = op(client, request)
+            reply["ok"] = True
+        except Exception as e:
+            reply = {"ok": False, "error": str(e) or type(e).__name__}
+        if isinstance(request, dict) and "id" in request:
+            reply["id"] = request["id"]
+        return _encode(reply)
+
+    def _send(self, client, event):
+        if client is not None and not client.writer.is_closing():
+            client.writer.write(_encode(event))
+
+    def _nrows(self, request):
+        """
+        The board size of a request, checked against MAX_NROWS
+
+        Returns: int
+        """
+        nrows = int(request.get("nrows", 3))
+        if not 1 <= nrows <= MAX_NROWS:
+            raise Exception("nrows must be between 1 and {}".format(MAX_NROWS))
+        return nrows
+
+    def _open(self, client, request):
+        server_game = ServerGame(next(self.ids), self._nrows(request))
+        server_game.players[1] = client
+        client.games[server_game.game_id] = 1
+        self.games[server_game.game_id] = server_game
+        return server_game
+
+    def _seat(self, client, server_game):
+        """
+        Seats a client as player 2 and tells player 1 the game has started
+
+        Returns: dict reply
+        """
+        server_game.players[2] = client
+        client.games[server_game.game_id] = 2
+        self._send(server_game.players[1], {"event": "start",
+                   "game": server_game.game_id, "player": 1,
+                   "nrows": server_game.nrows})
+        return {"game": server_game.game_id, "player": 2,
+                "nrows": server_game.nrows, "started": True}
+
+    def _new(self, client, request):
+        server_game = self._open(client, request)
+        return {"game": server_game.game_id, "player": 1,
+                "nrows": server_game.nrows, "started": False}
+
+    def _match(self, client, request):
+        nrows = self._nrows(request)
+        waiting = self.open_games.setdefault(nrows, deque())
+        own_games = []
+        while waiting:
+            game_id = waiting.popleft()
+            server_game = self.games.get(game_id)
+            if server_game is None or server_game.players[2] is not None:
+                continue
+            if server_game.players[1] is client:
+                # a client is never matched against itself, its games wait
+                own_games.append(game_id)
+                continue
+            waiting.extendleft(reversed(own_games))
+            return self._seat(client, server_game)
+        waiting.extend(own_games)
+        server_game = self._open(client, request)
+        waiting.append(server_game.game_id)
+        return {"game": server_game.game_id, "player": 1,
+                "nrows": server_game.nrows, "started": False}
+
+    def _join(self, client, request):
+        server_game = self.games.get(request.get("game"))
+        if server_game is None or server_game.players[2] is not None:
+            raise Exception("no open game {}".format(request.get("game")))
+        return self._seat(client, server_game)
+
+    def _player_game(self, client, request):
+        game_id = request.get("game")
+        player_num = client.games.get(game_id)
+        if player_num is None:
+            raise Exception("not playing in game {}".format(game_id))
+        return self.games[game_id], player_num
+
+    def _move(self, client, request):
+        server_game, player_num = self._player_game(client, request)
+        game = server_game.game
+        if server_game.players[2] is None:
+            raise Exception("waiting for an opponent")
+        if game.get_curr_player().player_num != player_num:
+            raise Exception("not your turn")
+        path = tuple(request.get("path", ()))
+        for move in game.legal_moves():
+            if move.path == path:
+                break
+        else:
+            raise Exception("illegal move")
+        end = game.play_move(move)
+        # moves are never taken back here, so their undo data is not kept
+        game.undo_stack.clear()
+        winner = player_num if end == "winner" else 0
+        self._send(server_game.players[3 - player_num], {"event": "move",
+                   "game": server_game.game_id, "path": list(path),
+                   "end": end, "winner": winner})
+        if end:
+            self._finish(server_game)
+        return {"end": end, "winner": winner}
+
+    def _state(self, client, request):
+        server_game = self.games.get(request.get("game"))
+        if server_game is None:
+            raise Exception("no game {}".format(request.get("game")))
+        game = server_game.game
+        bits = game.board.bits
+        return {"game": server_game.game_id, "nrows": server_game.nrows,
+                "turn": game.turn, "p1": bits.p1, "p2": bits.p2,
+                "kings": bits.kings,
+                "started": server_game.players[2] is not None}
+
+    def _resign(self, client, request):
+        server_game, _ = self._player_game(client, request)
+        self._leave(client, server_game.game_id, "resign")
+        return {"game": server_game.game_id}
+
+    def _leave(self, client, game_id, reason):
+        """
+        Ends a game a player resigned or disconnected from, the opponent
+        winning if there was one
+
+        Returns: None
+        """
+        server_game = self.games.get(game_id)
+        if server_game is None:
+            return
+        player_num = client.games[game_id]
+        opponent = server_game.players[3 - player_num]
+        if opponent is not None:
+            self._send(opponent, {"event": "end", "game": game_id,
+                       "winner": 3 - player_num, "reason": reason})
+        self._finish(server_game)
+
+    def _finish(self, server_game):
+        del self.games[server_game.game_id]
+        for client in server_game.players.values():
+            if client is not None:
+                client.games.pop(server_game.game_id, None)
+
+def _encode(message):
+    return (json.dumps(message, separators = (",", ":")) + "\n").encode()
+
+def serve(host = DEFAULT_HOST, port = DEFAULT_PORT):
+    """
+    Runs a game server until interrupted
+
+    Returns: None
+    """
+    try:
+        asyncio.run(GameServer(host, port).serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Checkers game server")
+    parser.add_argument("-H", "--host", type = str, default = DEFAULT_HOST)
+    parser.add_argument("-p", "--port", type = int, default = DEFAULT_PORT)
+    args = parser.parse_args()
+    serve(args.host, args.port)
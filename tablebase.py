@@ -0,0 +1,521 @@
+from bitboard import BitBoard, iter_bits
+from bisect import bisect_left
+from itertools import combinations
+from math import comb
+from multiprocessing import Pool
+import argparse
+import heapq
+import mmap
+import numpy as np
+import os
+import struct
+import sys
+import zlib
+
+MAGIC = b"CKTB"
+VERSION = 1
+BLOCK_SIZE = 4096
+
+# results, from the point of view of the player to move
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+_HEADER = struct.Struct("<4sBHHHHHHIQ")
+_NO_WIN = 1 << 30
+
+# Tablebase layout: one file per material signature (men and kings of each
+# player), all integers little endian:
+#
+#     header: magic "CKTB", version (u8), nrows (u16), ncols (u16),
+#             men and kings of player 1 then player 2 (u16 each),
+#             entries per block (u32), number of entries (u64)
+#     block offsets: one u64 per block plus the end of the last block,
+#                    counted from the start of the file
+#     blocks: zlib compressed arrays of int16 values
+#
+# Entry i holds the value of the position with perfect index i (see
+# _Indexer): 0 for a draw, d for a win in d plies and -(d + 1) for a loss in
+# d plies, for the player to move. Blocks are decompressed one at a time, so
+# a probe only reads the block it needs from the mapped file.
+
+def slice_name(nrows, ncols, signature):
+    """
+    File name of the tablebase of one material signature
+
+    Input:
+        nrows (int): number of rows of the board
+        ncols (int): number of columns of the board
+        signature (tuple): men and kings of player 1, then of player 2
+
+    Returns: str
+    """
+    return "tb{}x{}_{}_{}_{}_{}.cktb".format(nrows, ncols, *signature)
+
+def signatures(max_pieces):
+    """
+    Lists every material signature of up to max_pieces pieces, in an order
+    where captures and promotions only lead to signatures listed before
+
+    Input:
+        max_pieces (int): most pieces on the board
+
+    Returns: list[tuple]
+    """
+    found = []
+    for total in range(1, max_pieces + 1):
+        for m1 in range(total + 1):
+            for k1 in range(total - m1 + 1):
+                for m2 in range(total - m1 - k1 + 1):
+                    found.append((m1, k1, m2, total - m1 - k1 - m2))
+    found.sort(key = lambda sig: (sum(sig), sig[0] + sig[2]))
+    return found
+
+def _encode(result, distance):
+    if result == WIN:
+        return distance
+    if result == LOSS:
+        return -distance - 1
+    return 0
+
+def _decode(value):
+    if value > 0:
+        return WIN, value
+    if value < 0:
+        return LOSS, -value - 1
+    return DRAW, None
+
+class _Indexer:
+    """
+    Perfect index of the positions of one board size. The men of each player
+    are ranked among the squares they can stand on (every square but their
+    king row), then the kings of player 1 among the squares left free by the
+    men, then the kings of player 2 among the squares still free, then the
+    player to move. Placements where men of both players share a square are
+    given an index but never filled.
+    """
+    def __init__(self, nrows, ncols):
+        bits = BitBoard(nrows, ncols)
+        self.bits = bits
+        self.squares = list(iter_bits(bits.valid))
+        self.nsquares = len(self.squares)
+        self.dense = {sq: i for i, sq in enumerate(self.squares)}
+        self.men_squares = {}
+        self.men_rank = {}
+        for player_num in (1, 2):
+            allowed = [i for i, sq in enumerate(self.squares)
+                       if not bits.king_rows[player_num] >> sq & 1]
+            self.men_squares[player_num] = allowed
+            self.men_rank[player_num] = {d: i for i, d in enumerate(allowed)}
+
+    def sizes(self, signature):
+        """
+        Number of placements of each group of pieces
+
+        Returns: tuple (player 1 men, player 2 men, player 1 kings,
+        player 2 kings)
+        """
+        m1, k1, m2, k2 = signature
+        free = self.nsquares - m1 - m2
+        return (comb(len(self.men_squares[1]), m1),
+                comb(len(self.men_squares[2]), m2),
+                comb(free, k1), comb(free - k1, k2))
+
+    def size(self, signature):
+        n_m1, n_m2, n_k1, n_k2 = self.sizes(signature)
+        return n_m1 * n_m2 * n_k1 * n_k2 * 2
+
+    def signature(self, p1, p2, kings):
+        k1 = (p1 & kings).bit_count()
+        k2 = (p2 & kings).bit_count()
+        return (p1.bit_count() - k1, k1, p2.bit_count() - k2, k2)
+
+    def index(self, signature, p1, p2, kings, player_num):
+        """
+        Perfect index of a position within its signature
+
+        Input:
+            signature (tuple): material signature of the position
+            p1 (int): mask of player 1 pieces
+            p2 (int): mask of player 2 pieces
+            kings (int): mask of kings
+            player_num (int): player to move
+
+        Returns: int
+        """
+        dense = self.dense
+        men1 = [dense[sq] for sq in iter_bits(p1 & ~kings)]
+        men2 = [dense[sq] for sq in iter_bits(p2 & ~kings)]
+        kings1 = [dense[sq] for sq in iter_bits(p1 & kings)]
+        kings2 = [dense[sq] for sq in iter_bits(p2 & kings)]
+        rank1 = self.men_rank[1]
+        rank2 = self.men_rank[2]
+        r_m1 = _rank([rank1[d] for d in men1])
+        r_m2 = _rank([rank2[d] for d in men2])
+        men = sorted(men1 + men2)
+        r_k1 = _rank([d - bisect_left(men, d) for d in kings1])
+        taken = sorted(men + kings1)
+        r_k2 = _rank([d - bisect_left(taken, d) for d in kings2])
+        _, n_m2, n_k1, n_k2 = self.sizes(signature)
+        return ((((r_m1 * n_m2 + r_m2) * n_k1 + r_k1) * n_k2 + r_k2) * 2 +
+                player_num - 1)
+
+    def placements(self, signature):
+        """
+        Yields the masks of every placement of a signature's pieces
+
+        Returns: generator[tuple] of (p1, p2, kings)
+        """
+        m1, k1, m2, k2 = signature
+        bit = [1 << sq for sq in self.squares]
+        everywhere = range(self.nsquares)
+        for men1 in combinations(self.men_squares[1], m1):
+            mask_m1 = sum(bit[d] for d in men1)
+            for men2 in combinations(self.men_squares[2], m2):
+                mask_m2 = sum(bit[d] for d in men2)
+                if mask_m1 & mask_m2:
+                    continue
+                men = mask_m1 | mask_m2
+                free = [d for d in everywhere if not men & bit[d]]
+                for kings1 in combinations(free, k1):
+                    mask_k1 = sum(bit[d] for d in kings1)
+                    free2 = [d for d in free if not mask_k1 & bit[d]]
+                    for kings2 in combinations(free2, k2):
+                        mask_k2 = sum(bit[d] for d in kings2)
+                        yield (mask_m1 | mask_k1, mask_m2 | mask_k2,
+                               mask_k1 | mask_k2)
+
+def _rank(squares):
+    """
+    Colexicographic rank of a sorted combination
+
+    Returns: int
+    """
+    return sum(comb(d, i + 1) for i, d in enumerate(squares))
+
+class _Slice:
+    """
+    Memory-mapped tablebase file of one signature
+    """
+    def __init__(self, path):
+        self.f = open(path, "rb")
+        self.map = mmap.mmap(self.f.fileno(), 0, access = mmap.ACCESS_READ)
+        header = _HEADER.unpack_from(self.map)
+        if header[0] != MAGIC or header[1] != VERSION:
+            raise Exception("Not a tablebase file")
+        self.block_size = header[8]
+        self.count = header[9]
+        nblocks = -(-self.count // self.block_size)
+        self.offsets = np.frombuffer(self.map, dtype = "<u8",
+                                     count = nblocks + 1,
+                                     offset = _HEADER.size)
+        self.blocks = {}
+
+    def _block(self, i):
+        block = self.blocks.get(i)
+        if block is None:
+            if len(self.blocks) >= 64:
+                self.blocks.clear()
+            data = self.map[int(self.offsets[i]):int(self.offsets[i + 1])]
+            block = np.frombuffer(zlib.decompress(data), dtype = "<i2")
+            self.blocks[i] = block
+        return block
+
+    def value(self, index):
+        return int(self._block(index // self.block_size)[index %
+                   self.block_size])
+
+    def load(self):
+        """
+        Decompresses the whole file
+
+        Returns: ndarray of int16 values
+        """
+        return np.concatenate([self._block(i)
+                               for i in range(len(self.offsets) - 1)])
+
+class Tablebase:
+    """
+    Probes the tablebase files of one board size found in a directory
+    """
+    def __init__(self, directory, nrows = 8, ncols = 8):
+        """
+        Constructor
+
+        Args:
+            directory (str): directory holding the tablebase files
+            nrows (int): number of rows of the board
+            ncols (int): number of columns of the board
+
+        Attributes:
+            self.max_pieces = most pieces of any signature found on disk,
+            positions with more pieces are not probed
+        Returns: None
+        """
+        self.directory = directory
+        self.nrows = nrows
+        self.ncols = ncols
+        self.indexer = _Indexer(nrows, ncols)
+        self.slices = {}
+        self.max_pieces = 0
+        prefix = "tb{}x{}_".format(nrows, ncols)
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.startswith(prefix) and name.endswith(".cktb"):
+                    counts = name[len(prefix):-len(".cktb")].split("_")
+                    self.max_pieces = max(self.max_pieces,
+                                          sum(int(c) for c in counts))
+
+    def _slice(self, signature):
+        if signature not in self.slices:
+            path = os.path.join(self.directory,
+                                slice_name(self.nrows, self.ncols, signature))
+            self.slices[signature] = _Slice(path) if os.path.exists(path) \
+                                     else None
+        return self.slices[signature]
+
+    def probe(self, bits, player_num):
+        """
+        Looks up the result of a position with perfect play
+
+        Input:
+            bits (BitBoard): position to look up
+            player_num (int): player to move
+
+        Returns: None if the position is not in the tablebase, else tuple
+        (WIN, DRAW or LOSS for the player to move, distance to the end of
+        the game in plies or None for a draw)
+        """
+        if (bits.p1 | bits.p2).bit_count() > self.max_pieces:
+            return None
+        men = ~bits.kings
+        king_rows = bits.king_rows
+        if bits.p1 & men & king_rows[1] or bits.p2 & men & king_rows[2]:
+            # men are kinged as soon as they reach their king row
+            return None
+        signature = self.indexer.signature(bits.p1, bits.p2, bits.kings)
+        table = self._slice(signature)
+        if table is None:
+            return None
+        index = self.indexer.index(signature, bits.p1, bits.p2, bits.kings,
+                                   player_num)
+        return _decode(table.value(index))
+
+# generation state kept per worker process
+_worker = {}
+
+def _init_worker(directory, nrows, ncols):
+    _worker["tablebase"] = Tablebase(directory, nrows, ncols)
+    _worker["loaded"] = {}
+
+def _values(signature):
+    """
+    Fully decompressed values of a finished signature, loaded once per
+    worker
+
+    Returns: ndarray
+    """
+    loaded = _worker["loaded"]
+    if signature not in loaded:
+        loaded[signature] = _worker["tablebase"]._slice(signature).load()
+    return loaded[signature]
+
+def _scan(job):
+    """
+    Generates the moves of every position of one share of a signature.
+    Moves into other signatures are scored from their finished files, moves
+    within the signature are returned as edges to solve afterwards.
+
+    Input:
+        job (tuple): signature, share number and number of shares
+
+    Returns: tuple of numpy arrays
+    """
+    signature, share, nshares = job
+    indexer = _worker["tablebase"].indexer
+    bits = indexer.bits
+    king_rows = bits.king_rows
+    rows = []
+    edge_src = []
+    edge_dst = []
+    for i, (p1, p2, kings) in enumerate(indexer.placements(signature)):
+        if i % nshares != share:
+            continue
+        bits.p1, bits.p2, bits.kings = p1, p2, kings
+        for player_num in (1, 2):
+            index = indexer.index(signature, p1, p2, kings, player_num)
+            moves = bits.legal_moves(player_num)
+            if not moves:
+                # the game is over: a loss unless neither player can move
+                terminal = LOSS if bits.can_move(3 - player_num) else DRAW
+                rows.append((index, 0, _NO_WIN, 0, 1, terminal))
+                continue
+            count = 0
+            best_win = _NO_WIN
+            worst_loss = 0
+            drawn = 0
+            own, other = (p1, p2) if player_num == 1 else (p2, p1)
+            for move in moves:
+                src = 1 << move.path[0]
+                dst = 1 << move.path[-1]
+                captured = 0
+                for sq in move.captures:
+                    captured |= 1 << sq
+                new_own = own & ~src | dst
+                new_other = other & ~captured
+                new_kings = kings & ~src & ~captured
+                if kings & src or king_rows[player_num] & dst:
+                    new_kings |= dst
+                if player_num == 1:
+                    new_p1, new_p2 = new_own, new_other
+                else:
+                    new_p1, new_p2 = new_other, new_own
+                new_sig = indexer.signature(new_p1, new_p2, new_kings)
+                new_index = indexer.index(new_sig, new_p1, new_p2, new_kings,
+                                          3 - player_num)
+                if new_sig == signature:
+                    edge_src.append(index)
+                    edge_dst.append(new_index)
+                    count += 1
+                    continue
+                result, distance = _decode(int(_values(new_sig)[new_index]))
+                if result == LOSS:
+                    best_win = min(best_win, distance + 1)
+                elif result == WIN:
+                    worst_loss = max(worst_loss, distance + 1)
+                else:
+                    drawn = 1
+            rows.append((index, count, best_win, worst_loss, drawn, 2))
+    rows = np.array(rows, dtype = np.int64).reshape(-1, 6)
+    return (rows, np.array(edge_src, dtype = np.int64),
+            np.array(edge_dst, dtype = np.int64))
+
+def _solve(size, rows, edge_src, edge_dst):
+    """
+    Retrograde analysis of one signature. Positions are settled in order of
+    distance with a priority queue: a position is won as soon as one move
+    reaches a lost position and lost once every move reaches a won one.
+    Whatever is left unsettled is a draw.
+
+    Returns: ndarray of int16 values
+    """
+    values = np.zeros(size, dtype = np.int16)
+    settled = np.zeros(size, dtype = bool)
+    count = np.zeros(size, dtype = np.int64)
+    best_win = np.full(size, _NO_WIN, dtype = np.int64)
+    worst_loss = np.zeros(size, dtype = np.int64)
+    drawn = np.zeros(size, dtype = bool)
+    index = rows[:, 0]
+    count[index] = rows[:, 1]
+    best_win[index] = rows[:, 2]
+    worst_loss[index] = rows[:, 3]
+    drawn[index] = rows[:, 4].astype(bool)
+
+    queue = []
+    for i, c, win, loss, draw, terminal in rows.tolist():
+        if terminal == LOSS:
+            heapq.heappush(queue, (0, i, LOSS))
+        elif terminal == DRAW:
+            settled[i] = True
+        elif win != _NO_WIN:
+            heapq.heappush(queue, (win, i, WIN))
+        elif c == 0 and not draw:
+            heapq.heappush(queue, (loss, i, LOSS))
+
+    order = np.argsort(edge_dst, kind = "stable")
+    preds = edge_src[order].tolist()
+    starts = np.searchsorted(edge_dst[order], np.arange(size + 1)).tolist()
+    count = count.tolist()
+    best_win = best_win.tolist()
+    worst_loss = worst_loss.tolist()
+    drawn = drawn.tolist()
+    settled_list = settled.tolist()
+
+    while queue:
+        distance, i, result = heapq.heappop(queue)
+        if settled_list[i]:
+            continue
+        settled_list[i] = True
+        values[i] = _encode(result, distance)
+        for p in preds[starts[i]:starts[i + 1]]:
+            if settled_list[p]:
+                continue
+            if result == LOSS:
+                if distance + 1 < best_win[p]:
+                    best_win[p] = distance + 1
+                    heapq.heappush(queue, (distance + 1, p, WIN))
+            else:
+                count[p] -= 1
+                worst_loss[p] = max(worst_loss[p], distance + 1)
+                if count[p] == 0 and not drawn[p] and best_win[p] == _NO_WIN:
+                    heapq.heappush(queue, (worst_loss[p], p, LOSS))
+    return values
+
+def _write(path, nrows, ncols, signature, values):
+    """
+    Writes a tablebase file, going through a temporary file so an
+    interrupted generation never leaves a partial file behind
+    """
+    blocks = [zlib.compress(values[i:i + BLOCK_SIZE].astype("<i2").tobytes(),
+              9) for i in range(0, len(values), BLOCK_SIZE)]
+    offsets = [_HEADER.size + 8 * (len(blocks) + 1)]
+    for block in blocks:
+        offsets.append(offsets[-1] + len(block))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, nrows, ncols, *signature,
+                             BLOCK_SIZE, len(values)))
+        f.write(struct.pack("<{}Q".format(len(offsets)), *offsets))
+        for block in blocks:
+            f.write(block)
+    os.replace(tmp, path)
+
+def generate(directory, nrows, ncols, max_pieces, workers = 0, log = None):
+    """
+    Builds the tablebases of every signature of up to max_pieces pieces.
+    Finished signatures are skipped, so an interrupted run picks up where it
+    stopped. The moves of each signature are generated across a process
+    pool.
+
+    Input:
+        directory (str): directory the files are written to
+        nrows (int): number of rows of the board
+        ncols (int): number of columns of the board
+        max_pieces (int): most pieces on the board
+        workers (int): number of processes, 0 uses every core
+        log (None or file): where progress is reported
+
+    Returns: None
+    """
+    os.makedirs(directory, exist_ok = True)
+    workers = workers or os.cpu_count()
+    indexer = _Indexer(nrows, ncols)
+    todo = [sig for sig in signatures(max_pieces)
+            if not os.path.exists(os.path.join(directory,
+            slice_name(nrows, ncols, sig)))]
+    for signature in todo:
+        # a new pool per signature so workers see the files written so far
+        with Pool(workers, _init_worker, (directory, nrows, ncols)) as pool:
+            nshares = workers * 4
+            results = pool.map(_scan, [(signature, share, nshares)
+                                       for share in range(nshares)])
+        rows = np.concatenate([r[0] for r in results])
+        edge_src = np.concatenate([r[1] for r in results])
+        edge_dst = np.concatenate([r[2] for r in results])
+        values = _solve(indexer.size(signature), rows, edge_src, edge_dst)
+        _write(os.path.join(directory, slice_name(nrows, ncols, signature)),
+               nrows, ncols, signature, values)
+        if log is not None:
+            log.write("{} {} positions\n".format(signature, len(rows)))
+            log.flush()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description =
+    "Generate endgame tablebases")
+    parser.add_argument("directory", type = str)
+    parser.add_argument("-n", "--nrows", type = int, default = 3)
+    parser.add_argument("-p", "--pieces", type = int, default = 3)
+    parser.add_argument("-w", "--workers", type = int, default = 0)
+    args = parser.parse_args()
+    size = 2 * args.nrows + 2
+    generate(args.directory, size, size, args.pieces, args.workers, sys.stdout)
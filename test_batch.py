@@ -0,0 +1,53 @@
+from igl import CheckersGame
+from batch import GameBatch, DIRECTIONS
+from engine import evaluate
+from records import result_code
+import random
+
+# Checks of GameBatch: evaluation, results and move masks of a batch agree
+# with the BitBoards it was built from.
+
+def test_batch_matches_bitboard():
+    rng = random.Random(15)
+    games = []
+    for _ in range(400):
+        game = CheckersGame(3)
+        for _ in range(rng.randrange(120)):
+            moves = game.legal_moves()
+            if not moves or game.play_move(rng.choice(moves)):
+                break
+        games.append(game)
+    batch = GameBatch.from_games(games)
+    scores = batch.evaluate()
+    statuses = batch.status()
+    move_masks = batch.move_masks()
+    jump_masks = batch.jump_masks()
+    for k, game in enumerate(games):
+        bits = game.board.bits
+        player_num = game.get_curr_player().player_num
+        assert scores[k] == evaluate(bits, player_num)
+        # the batch has no history, so only results of the position count
+        end = None
+        if not bits.can_move(player_num):
+            end = "winner" if bits.can_move(3 - player_num) else "draw"
+        assert statuses[k] == result_code(end, 3 - player_num)
+        steps = set()
+        jumps = set()
+        for d, (dr, dc) in enumerate(DIRECTIONS):
+            for r, c in zip(*move_masks[k, d].nonzero()):
+                steps.add((bits.square((r, c)), bits.square((r + dr, c + dc))))
+            for r, c in zip(*jump_masks[k, d].nonzero()):
+                jumps.add((bits.square((r, c)),
+                           bits.square((r + 2 * dr, c + 2 * dc))))
+        assert steps == set(bits.moves(player_num))
+        assert jumps == {move.path[:2] for move in bits.jump_moves(player_num)}
+        other = batch.to_game(k)
+        copy = other.board.bits
+        assert (copy.p1, copy.p2, copy.kings, copy.hash, other.turn) == \
+               (bits.p1, bits.p2, bits.kings, bits.hash, game.turn)
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print("{}: ok".format(name))
@@ -0,0 +1,28 @@
+from igl import CheckersGame
+from engine import SearchEngine
+import random
+import time
+
+# Checks of the alpha-beta search: it keeps to its time budget on positions
+# whose capture trees are far larger than the budget allows.
+
+def test_search_keeps_to_time_limit():
+    for seed in (2, 11):
+        rng = random.Random(seed)
+        game = CheckersGame(8)
+        for _ in range(rng.randrange(20, 80)):
+            moves = game.legal_moves()
+            if not moves or game.play_move(rng.choice(moves)):
+                break
+        played = len(game.undo_stack)
+        start = time.perf_counter()
+        move = SearchEngine().search(game, 0.05)
+        assert time.perf_counter() - start < 1.0
+        assert move in game.legal_moves()
+        assert len(game.undo_stack) == played
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print("{}: ok".format(name))
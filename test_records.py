@@ -0,0 +1,111 @@
+from igl import CheckersGame
+from records import (GameRecord, RecordWriter, _FILE_HEADER, MAGIC, RULES,
+                     RESULT_P1, from_pdn, read_games, result_code, to_pdn)
+from replay import read_records, replay_game
+import io
+import json
+import random
+
+# Checks of the game records: games written to binary archives, selfplay.py
+# JSON lines and PDN read back unchanged, draw rules included, and replay
+# ends them where they ended.
+
+def _random_game(seed, n = 3, draw_plies = 10, repetitions = 2):
+    """
+    Plays random moves until the game ends or 200 plies
+
+    Returns: tuple of the moves and the RESULT_ code
+    """
+    rng = random.Random(seed)
+    game = CheckersGame(n, draw_plies, repetitions)
+    moves = []
+    end = None
+    while end is None and len(moves) < 200:
+        legal = game.legal_moves()
+        if not legal:
+            break
+        moves.append(rng.choice(legal))
+        end = game.play_move(moves[-1])
+    winner = game.get_other_player().player_num if end == "winner" else 0
+    return moves, result_code(end, winner)
+
+def _archive(games, size = 8, draw_plies = 10, repetitions = 2):
+    f = io.BytesIO()
+    writer = RecordWriter(f, size, size, draw_plies, repetitions)
+    for moves, result in games:
+        writer.write_game(moves, result)
+    return io.BufferedReader(io.BytesIO(f.getvalue()))
+
+def test_archive_round_trip():
+    # one byte per square up to 22x22, two bytes above
+    for n in (3, 11):
+        size = 2 * n + 2
+        games = [_random_game(seed, n) for seed in range(10)]
+        assert any(len(m.path) > 2 for moves, _ in games for m in moves)
+        records = list(read_games(_archive(games, size)))
+        assert [(r.nrows, r.ncols) for r in records] == [(size, size)] * 10
+        assert [(r.moves, r.result) for r in records] == games
+        skipped = list(read_games(_archive(games, size), decode_moves = False))
+        assert [(r.moves, r.result) for r in skipped] == \
+               [(None, result) for _, result in games]
+
+def test_truncated_archive():
+    data = _archive([_random_game(4)]).read()
+    for length in (3, len(data) - 1):
+        try:
+            list(read_games(io.BytesIO(data[:length])))
+        except Exception as e:
+            assert "archive" in str(e)
+        else:
+            assert False, "read {} bytes of {}".format(length, len(data))
+
+def test_pdn_round_trip():
+    for seed in range(10):
+        moves, result = _random_game(seed)
+        record = GameRecord(8, 8, result, moves)
+        assert from_pdn(to_pdn(record)) == record
+    # standard numbering: player 1 starts on squares 1 to 12
+    game = CheckersGame(3)
+    move, = [m for m in game.legal_moves()
+             if m.path == (game.board.bits.square((5, 0)),
+                           game.board.bits.square((4, 1)))]
+    pdn = to_pdn(GameRecord(8, 8, RESULT_P1, [move]))
+    assert pdn.split("\n")[-2] == "1. 12-16 1-0"
+    assert from_pdn("1. 12-16 1-0").moves == [move]
+
+def test_draw_rules_stored():
+    games = [_random_game(seed) for seed in range(20)]
+    records = list(read_games(_archive(games)))
+    assert [(r.moves, r.result) for r in records] == games
+    assert all((r.draw_plies, r.repetitions) == (10, 2) for r in records)
+    for record in records:
+        assert from_pdn(to_pdn(record)) == record
+        # replayed with the stored rules, not the default ones
+        assert replay_game(record)["error"] is None
+
+    lines = "".join(json.dumps({"nrows": 3, "moves": [list(m.path)
+                     for m in moves], "result": "draw", "winner": 0,
+                     "draw_plies": 10, "repetitions": 2}) + "\n"
+                    for moves, _ in games)
+    records = list(read_records(io.BufferedReader(io.BytesIO(
+                   lines.encode()))))
+    assert all((r.draw_plies, r.repetitions) == (10, 2) for r in records)
+
+def test_version_1_archive():
+    # archives from before the draw rules were stored still read
+    moves, result = _random_game(1)
+    f = _archive([(moves, result)])
+    data = bytearray(f.read())
+    data[:_FILE_HEADER.size] = _FILE_HEADER.pack(MAGIC, 1, 8, 8, RULES, 1)
+    del data[_FILE_HEADER.size:_FILE_HEADER.size + 3]
+    record, = read_games(io.BytesIO(bytes(data)))
+    assert (record.moves, record.result) == (moves, result)
+    assert (record.draw_plies, record.repetitions) == (None, None)
+    assert replay_game(record, draw_plies = 10, repetitions = 2)["error"] \
+           is None
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print("{}: ok".format(name))
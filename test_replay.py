@@ -0,0 +1,135 @@
+from igl import CheckersGame
+from records import (GameRecord, RecordWriter, RESULT_DRAW, RESULT_P1,
+                     RESULT_P2, result_code, to_pdn)
+from replay import read_records, replay_game
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+
+# Checks of the replay mode: games in every input format are read one at a
+# time and replayed, and replay reports illegal moves and wrong results.
+
+def _random_games(count, n = 3, seed = 20):
+    """
+    Random games played to their end, which the draw rules guarantee
+
+    Returns: list of tuples of the moves and the RESULT_ code
+    """
+    rng = random.Random(seed)
+    games = []
+    for _ in range(count):
+        game = CheckersGame(n)
+        moves = []
+        end = None
+        while end is None:
+            moves.append(rng.choice(game.legal_moves()))
+            end = game.play_move(moves[-1])
+        winner = game.get_other_player().player_num if end == "winner" else 0
+        games.append((moves, result_code(end, winner)))
+    return games
+
+def _binary(games, size = 8):
+    f = io.BytesIO()
+    writer = RecordWriter(f, size, size)
+    for moves, result in games:
+        writer.write_game(moves, result)
+    return f.getvalue()
+
+def _json_lines(games, n = 3):
+    results = {RESULT_P1: ("winner", 1), RESULT_P2: ("winner", 2),
+               RESULT_DRAW: ("draw", 0)}
+    return "".join(json.dumps({"nrows": n, "moves": [list(move.path)
+                   for move in moves], "result": results[result][0],
+                   "winner": results[result][1]}) + "\n"
+                   for moves, result in games).encode()
+
+def _pdn(games, size = 8):
+    return "\n".join(to_pdn(GameRecord(size, size, result, moves))
+                     for moves, result in games).encode()
+
+class _Chunks(io.RawIOBase):
+    """
+    A raw stream that hands out its data a few bytes per read, counting
+    how much has been read
+    """
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self.data[self.pos:self.pos + min(len(buffer), 256)]
+        buffer[:len(chunk)] = chunk
+        self.pos += len(chunk)
+        return len(chunk)
+
+def _read(data, nrows = 3):
+    return list(read_records(io.BufferedReader(_Chunks(data)), nrows))
+
+def test_read_records_formats():
+    games = _random_games(10)
+    for data in (_binary(games), _json_lines(games), _pdn(games)):
+        records = _read(data)
+        assert [(r.moves, r.result) for r in records] == games
+        assert [(r.nrows, r.ncols) for r in records] == [(8, 8)] * 10
+    # PDN moves without tags are played on the board of nrows
+    moves, result = games[0]
+    text = to_pdn(GameRecord(8, 8, result, moves)).split("\n\n", 1)[1]
+    record, = _read(text.encode())
+    assert (record.nrows, record.moves, record.result) == (8, moves, result)
+
+def test_read_records_streams():
+    games = _random_games(200)
+    for data in (_binary(games), _json_lines(games), _pdn(games)):
+        stream = _Chunks(data)
+        records = read_records(io.BufferedReader(stream))
+        assert next(records).moves == games[0][0]
+        assert stream.pos < len(data) // 4
+
+def test_replay_matches_records():
+    for n in (3, 5):
+        for moves, result in _random_games(10, n):
+            size = 2 * n + 2
+            times = []
+            state = replay_game(GameRecord(size, size, result, moves), times)
+            assert state["error"] is None
+            assert (state["plies"], state["result"]) == (len(moves), result)
+            assert len(times) == len(moves)
+
+def test_replay_errors():
+    (moves, result), = _random_games(1)
+    # a move of the other player's piece
+    bad = GameRecord(8, 8, result, moves[:4] + moves[5:])
+    state = replay_game(bad)
+    assert state["plies"] == 4 and "move 5" in state["error"]
+    wrong = RESULT_P2 if result == RESULT_P1 else RESULT_P1
+    state = replay_game(GameRecord(8, 8, wrong, moves))
+    assert "recorded result" in state["error"]
+    state = replay_game(GameRecord(8, 8, result, moves + moves[-1:]))
+    assert state["plies"] == len(moves) and "after the game ended" in \
+           state["error"]
+
+def test_replay_command():
+    (moves, result), = _random_games(1)
+    env = dict(os.environ, PYTHONPATH = os.path.dirname(
+               os.path.abspath(__file__)))
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "checkers.py")
+    for recorded, status in ((result, 0), (RESULT_DRAW if result !=
+                             RESULT_DRAW else RESULT_P1, 1)):
+        done = subprocess.run([sys.executable, script, "--stdin-moves"],
+                              input = _pdn([(moves, recorded)]),
+                              capture_output = True, env = env)
+        assert done.returncode == status
+        assert "games with errors: {}".format(status).encode() in done.stdout
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print("{}: ok".format(name))
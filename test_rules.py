@@ -0,0 +1,282 @@
+from igl import CheckersGame, DRAW_PLIES, REPETITIONS
+from bitboard import BitBoard
+from engine import evaluate
+from perft import perft
+import os
+import random
+import subprocess
+import sys
+
+# Regression checks of the rules engine. Move generation is compared with a
+# slow reference written directly over board locations, piece counts and
+# hashes are checked through make/unmake and perft counts are pinned. Run with
+# pytest or directly with "python3 test_rules.py".
+
+# perft counts from the starting position for n rows of pieces per player
+PERFT = {1: [3, 9, 16, 29, 47, 74, 136, 272],
+         2: [5, 25, 141, 770, 4222, 22599, 118535],
+         3: [7, 49, 379, 2872, 23582, 190647]}
+
+def _reference_moves(pieces, size, player_num):
+    """
+    Every move of a player found by walking the board location by location:
+    men step and jump forward, kings in all four directions, a piece is not
+    kinged during a multi-jump, captured pieces stay on the board until the
+    move ends and every prefix of a multi-jump is a move of its own
+
+    Input:
+        pieces (dict): (player number, is king) of every occupied location
+        size (int): number of rows and columns of the board
+        player_num (int): 1 or 2
+
+    Returns: set of (path, captures) tuples of locations
+    """
+    forward = -1 if player_num == 1 else 1
+    moves = set()
+
+    def on_board(loc):
+        return 0 <= loc[0] < size and 0 <= loc[1] < size
+
+    def walk(src, dirs, at, path, captures):
+        for dr, dc in dirs:
+            mid = (at[0] + dr, at[1] + dc)
+            land = (at[0] + 2 * dr, at[1] + 2 * dc)
+            if (on_board(land) and mid in pieces and
+                pieces[mid][0] != player_num and mid not in captures and
+                (land not in pieces or land == src)):
+                moves.add((path + (land,), captures + (mid,)))
+                walk(src, dirs, land, path + (land,), captures + (mid,))
+
+    for loc, (owner, king) in pieces.items():
+        if owner != player_num:
+            continue
+        dirs = [(dr, dc) for dr in (-1, 1) for dc in (-1, 1)
+                if king or dr == forward]
+        for dr, dc in dirs:
+            dst = (loc[0] + dr, loc[1] + dc)
+            if on_board(dst) and dst not in pieces:
+                moves.add(((loc, dst), ()))
+        walk(loc, dirs, loc, (loc,), ())
+    return moves
+
+def _snapshot(n, pieces, turn = 1, draw_plies = DRAW_PLIES,
+              repetitions = REPETITIONS):
+    """
+    State of a game with the given pieces, for CheckersGame.from_snapshot
+
+    Input:
+        n (int): number of rows of pieces per player of the board
+        pieces (dict): (player number, is king) of every occupied location
+
+    Returns: tuple
+    """
+    size = 2 * n + 2
+    bits = BitBoard(size, size)
+    p1 = p2 = kings = 0
+    for loc, (owner, king) in pieces.items():
+        sq = bits.square(loc)
+        if owner == 1:
+            p1 |= 1 << sq
+        else:
+            p2 |= 1 << sq
+        if king:
+            kings |= 1 << sq
+    return (n, p1, p2, kings, turn, draw_plies, repetitions)
+
+def _random_position(rng, n):
+    """
+    A game with randomly placed pieces, most of them kings, and a random
+    player to move. Men are never placed on their own king row.
+
+    Returns: tuple of the CheckersGame and its pieces by location
+    """
+    size = 2 * n + 2
+    pieces = {}
+    locs = [(r, c) for r in range(size) for c in range((r + 1) % 2, size, 2)]
+    for loc in rng.sample(locs, rng.randint(2, min(14, len(locs)))):
+        owner = rng.choice((1, 2))
+        king = rng.random() < 0.6 or loc[0] == (0 if owner == 1 else size - 1)
+        pieces[loc] = (owner, king)
+    snapshot = _snapshot(n, pieces, rng.choice((1, 2)))
+    return CheckersGame.from_snapshot(snapshot), pieces
+
+def test_legal_moves_match_reference():
+    rng = random.Random(12)
+    for _ in range(600):
+        game, pieces = _random_position(rng, rng.choice((2, 3, 4)))
+        bits = game.board.bits
+        player_num = game.get_curr_player().player_num
+        moves = bits.legal_moves(player_num)
+        found = [(tuple(bits.loc(sq) for sq in move.path),
+                  tuple(bits.loc(sq) for sq in move.captures))
+                 for move in moves]
+        assert len(found) == len(set(found))
+        assert set(found) == _reference_moves(pieces, bits.nrows, player_num)
+        # jumps are listed first
+        captures = [bool(move.captures) for move in moves]
+        assert captures == sorted(captures, reverse = True)
+
+def test_maximal_jumps_are_not_prefixes():
+    rng = random.Random(16)
+    for _ in range(300):
+        game, _ = _random_position(rng, rng.choice((2, 3, 4)))
+        bits = game.board.bits
+        player_num = game.get_curr_player().player_num
+        paths = {move.path for move in bits.jump_moves(player_num)}
+        maximal = [move.path for move in bits.jump_moves(player_num, True)]
+        assert len(maximal) == len(set(maximal))
+        assert set(maximal) == {path for path in paths if not any(
+            other[:len(path)] == path and other != path for other in paths)}
+
+def test_piece_options_match_legal_moves():
+    # the per-piece calls the TUI makes offer the same moves as legal_moves
+    rng = random.Random(13)
+    for _ in range(300):
+        game, pieces = _random_position(rng, rng.choice((2, 3)))
+        bits = game.board.bits
+        player_num = game.get_curr_player().player_num
+        offered = set()
+        for loc, (owner, _) in pieces.items():
+            if owner != player_num:
+                continue
+            for dst in game.get_possible_moves(loc):
+                offered.add((bits.square(loc), bits.square(dst)))
+            for move in game.get_possible_jumps(loc):
+                offered.add(move.path)
+        assert offered == {move.path for move in bits.legal_moves(player_num)}
+
+def _check_counts(game):
+    bits = game.board.bits
+    for player in (game.player1, game.player2):
+        own = bits.pieces(player.player_num)
+        assert player.kings == (own & bits.kings).bit_count()
+        assert player.men == own.bit_count() - player.kings
+    assert bits.hash == bits.compute_hash()
+    assert game.material() == evaluate(bits,
+                                       game.get_curr_player().player_num)
+
+def test_make_unmake_restores_state():
+    rng = random.Random(14)
+    for _ in range(100):
+        game = CheckersGame(rng.choice((1, 2, 3)))
+        bits = game.board.bits
+        start = (bits.p1, bits.p2, bits.kings, bits.hash, game.turn)
+        for _ in range(rng.randrange(200)):
+            moves = game.legal_moves()
+            if not moves:
+                break
+            game.make_move(rng.choice(moves))
+            _check_counts(game)
+        while game.undo_stack:
+            game.unmake_move()
+            _check_counts(game)
+        assert (bits.p1, bits.p2, bits.kings, bits.hash, game.turn) == start
+
+def test_perft():
+    for n, counts in PERFT.items():
+        game = CheckersGame(n)
+        for depth, nodes in enumerate(counts, 1):
+            assert perft(game, depth) == nodes
+        assert not game.undo_stack
+
+def test_snapshot_round_trip():
+    rng = random.Random(21)
+    for _ in range(50):
+        game = CheckersGame(rng.choice((2, 3, 4)), rng.randrange(100),
+                            rng.randrange(4))
+        for _ in range(rng.randrange(60)):
+            if game.play_move(rng.choice(game.legal_moves())):
+                break
+        copy = CheckersGame.from_snapshot(game.snapshot())
+        assert copy.snapshot() == game.snapshot()
+        assert copy.position_hash() == game.position_hash()
+        _check_counts(copy)
+
+def _set_position(pieces, draw_plies, repetitions):
+    """
+    An 8x8 game with player 1 to move
+
+    Input:
+        pieces (dict): (player number, is king) of every occupied location
+        draw_plies (int): draw rule, see CheckersGame
+        repetitions (int): draw rule, see CheckersGame
+
+    Returns: CheckersGame
+    """
+    return CheckersGame.from_snapshot(_snapshot(3, pieces, 1, draw_plies,
+                                                repetitions))
+
+def _play_paths(game, paths):
+    """
+    Plays moves given as paths of locations
+
+    Returns: list of what play_move returned for every move
+    """
+    bits = game.board.bits
+    ends = []
+    for path in paths:
+        squares = tuple(bits.square(loc) for loc in path)
+        move = next(m for m in game.legal_moves() if m.path == squares)
+        ends.append(game.play_move(move))
+    return ends
+
+# two kings stepping out and back, returning to the start every 4 plies
+_KINGS = {(4, 1): (1, True), (1, 6): (2, True)}
+_SHUFFLE = [((4, 1), (3, 0)), ((1, 6), (0, 7)),
+            ((3, 0), (4, 1)), ((0, 7), (1, 6))]
+
+def test_threefold_repetition():
+    game = _set_position(_KINGS, 0, 3)
+    # the start is reached a third time after 8 plies
+    assert _play_paths(game, _SHUFFLE * 2) == [None] * 7 + ["draw"]
+    game = _set_position(_KINGS, 0, 0)
+    assert _play_paths(game, _SHUFFLE * 3) == [None] * 12
+
+def test_quiet_ply_limit():
+    game = _set_position(_KINGS, 6, 0)
+    assert _play_paths(game, _SHUFFLE * 2)[:6] == [None] * 5 + ["draw"]
+
+def test_man_move_restarts_history():
+    pieces = dict(_KINGS)
+    pieces[(1, 2)] = (2, False)
+    game = _set_position(pieces, 4, 3)
+    ends = _play_paths(game, _SHUFFLE[:3] + [((1, 2), (2, 3))])
+    assert ends == [None] * 4
+    assert game.quiet_plies == 0 and len(game.seen) == 1
+    # four more quiet plies are needed, the earlier positions are forgotten
+    ends = _play_paths(game, [((4, 1), (3, 0)), ((0, 7), (1, 6)),
+                              ((3, 0), (4, 1)), ((1, 6), (0, 7))])
+    assert ends == [None] * 3 + ["draw"]
+
+def test_capture_restarts_history():
+    pieces = {(4, 1): (1, True), (6, 7): (1, True), (0, 7): (2, True),
+              (3, 2): (2, False)}
+    game = _set_position(pieces, 4, 0)
+    ends = _play_paths(game, [((6, 7), (5, 6)), ((0, 7), (1, 6)),
+                              ((4, 1), (2, 3))])
+    assert ends == [None] * 3
+    assert game.quiet_plies == 0 and game.player2.piece_count == 1
+    ends = _play_paths(game, [((1, 6), (0, 7)), ((5, 6), (6, 7)),
+                              ((0, 7), (1, 6)), ((6, 7), (5, 6))])
+    assert ends == [None] * 3 + ["draw"]
+
+def _perft_command(moves):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "checkers.py")
+    return subprocess.run([sys.executable, script, "perft", "--depth", "2",
+                           "--moves", moves], capture_output = True,
+                          text = True)
+
+def test_perft_rejects_illegal_moves():
+    # a player 2 man moving first, a sideways step and a jump over nothing
+    for moves in ("22-18", "30-31", "9-13 24-20 13x22"):
+        done = _perft_command(moves)
+        assert done.returncode == 1 and "illegal" in done.stderr
+    done = _perft_command("9-13 22-18")
+    assert done.returncode == 0 and "nodes:" in done.stdout
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print("{}: ok".format(name))
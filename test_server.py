@@ -0,0 +1,143 @@
+from igl import OnlineCheckersGame
+from replay import _option
+from server import GameServer
+import asyncio
+import json
+import random
+import socket
+import threading
+
+# Checks of the online mode: a GameServer runs on an event loop in a
+# background thread and OnlineCheckersGame clients play against it.
+
+def _start_server():
+    """
+    Starts a GameServer on a free port in a background thread
+
+    Returns: tuple of the GameServer and the function that stops it
+    """
+    server = GameServer(port = 0)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        started.set()
+        loop.run_forever()
+        server.server.close()
+        # connections still open are dropped
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks,
+                                               return_exceptions = True))
+        loop.close()
+
+    thread = threading.Thread(target = run, daemon = True)
+    thread.start()
+    started.wait()
+
+    def stop():
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+    return server, stop
+
+def _connect_pair(port, nrows = 3):
+    """
+    Two clients matched into the same game, by player number
+
+    Returns: dict
+    """
+    games = {}
+
+    def connect():
+        game = OnlineCheckersGame({"host": "127.0.0.1", "port": port,
+                                   "nrows": nrows})
+        games[game.player_num] = game
+
+    threads = [threading.Thread(target = connect) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return games
+
+def _play_local(game, move):
+    choice, loc, possible_moves, possible_jumps = _option(game, move)
+    end_loc = game.complete_turn(choice, loc, possible_moves, possible_jumps)
+    return game.end_turn(end_loc)
+
+def test_random_game_through_server():
+    server, stop = _start_server()
+    try:
+        games = _connect_pair(server.port)
+        rng = random.Random(3)
+        end = None
+        for _ in range(300):
+            mover = games[games[1].get_curr_player().player_num]
+            waiter = games[3 - mover.player_num]
+            move = rng.choice(mover.legal_moves())
+            end = _play_local(mover, move)
+            assert waiter.wait_for_move() == move
+            assert waiter.play_move(move) == end
+            if end:
+                break
+        bits = [game.board.bits for game in games.values()]
+        assert (bits[0].p1, bits[0].p2, bits[0].kings) == \
+               (bits[1].p1, bits[1].p2, bits[1].kings)
+        for game in games.values():
+            game.resign()
+    finally:
+        stop()
+    assert not server.games
+
+def test_opponent_resigning_during_turn():
+    server, stop = _start_server()
+    try:
+        games = _connect_pair(server.port)
+        games[2].resign()
+        assert _play_local(games[1], games[1].legal_moves()[0]) == "left"
+        games[1].resign()
+    finally:
+        stop()
+
+def test_resign_closes_connection():
+    server, stop = _start_server()
+    try:
+        games = _connect_pair(server.port)
+        games[1].resign()
+        assert games[1].stream.closed
+        assert games[1].sock.fileno() == -1
+        assert games[2].wait_for_move() is None
+        games[2].resign()
+    finally:
+        stop()
+
+def test_bad_requests():
+    server, stop = _start_server()
+    try:
+        with socket.create_connection(("127.0.0.1", server.port)) as sock:
+            stream = sock.makefile("rwb")
+            for nrows in range(100, 200):
+                stream.write(json.dumps({"op": "match",
+                                         "nrows": nrows}).encode() + b"\n")
+                stream.flush()
+                assert not json.loads(stream.readline())["ok"]
+            assert not server.open_games
+            # a line over the stream limit drops only that connection
+            stream.write(b"x" * 2 ** 17 + b"\n")
+            stream.flush()
+            assert stream.readline() == b""
+        games = _connect_pair(server.port)
+        assert set(games) == {1, 2}
+        for game in games.values():
+            game.resign()
+    finally:
+        stop()
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print("{}: ok".format(name))
@@ -0,0 +1,45 @@
+from bitboard import BitBoard
+from tablebase import Tablebase, generate, signatures, WIN, LOSS, DRAW
+import tempfile
+
+# Checks of the endgame tablebases: every position of a small table agrees
+# with the results of its successors.
+
+def test_tablebase_consistent():
+    # every 6x6 position of up to 3 pieces agrees with its successors
+    with tempfile.TemporaryDirectory() as directory:
+        generate(directory, 6, 6, 3, workers = 1)
+        tablebase = Tablebase(directory, 6, 6)
+        indexer = tablebase.indexer
+        bits = indexer.bits
+        work = BitBoard(6, 6)
+        for signature in signatures(3):
+            for p1, p2, kings in indexer.placements(signature):
+                for side in (1, 2):
+                    bits.p1, bits.p2, bits.kings = p1, p2, kings
+                    found = tablebase.probe(bits, side)
+                    moves = bits.legal_moves(side)
+                    if not moves:
+                        expected = (LOSS, 0) if bits.can_move(3 - side) \
+                                   else (DRAW, None)
+                        assert found == expected
+                        continue
+                    results = []
+                    for move in moves:
+                        work.p1, work.p2, work.kings = p1, p2, kings
+                        work.apply(move, side)
+                        results.append(tablebase.probe(work, 3 - side))
+                    losses = [d for r, d in results if r == LOSS]
+                    if losses:
+                        expected = (WIN, min(losses) + 1)
+                    elif all(r == WIN for r, _ in results):
+                        expected = (LOSS, max(d for _, d in results) + 1)
+                    else:
+                        expected = (DRAW, None)
+                    assert found == expected
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print("{}: ok".format(name))
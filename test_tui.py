@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+# Checks of the TUI, driven by scripted input through checkers.py --input.
+
+def _session(answers, nrows = 3):
+    """
+    Plays a scripted session, the answers one per line
+
+    Returns: str output of the TUI
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.NamedTemporaryFile("w", suffix = ".txt") as f:
+        f.write("\n".join(answers) + "\n")
+        f.flush()
+        done = subprocess.run([sys.executable, os.path.join(here,
+                              "checkers.py"), "--nrows", str(nrows),
+                              "--input", f.name], capture_output = True,
+                              text = True, timeout = 60,
+                              env = dict(os.environ, PYTHONPATH = here))
+    return done.stdout
+
+def test_invalid_input_messages():
+    # F1 is a man on the edge with a single option
+    output = _session(["F1", "9", "resign"])
+    assert "invalid choice, please select from 1 to 1" in output
+    assert "invalid move" not in output
+    output = _session(["A1", "resign"])
+    assert "invalid move, please select another piece" in output
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print("{}: ok".format(name))
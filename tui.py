@@ -1,106 +1,197 @@
-from igl import CheckersGame, CheckerPiece
+from igl import (CheckersGame, OnlineCheckersGame, EMPTY, P1_MAN, P2_MAN,
+                 DRAW_PLIES, REPETITIONS)
+from engine import SearchEngine
+from mcts import MCTSEngine
+from book import OpeningBook
+from bitboard import iter_bits
 import os
+import shutil
+import sys
 from math import floor
 from rich import print
 
+# Markup of every square code, precomputed instead of formatting a string
+# per square and frame
+_COLORS = ("white", "red", "red", "yellow", "yellow")
+_TYPINGS = ("0", "0", "K", "0", "K")
+MARKUP = tuple("[bold {0}]{1}[/bold {0}]|".format(color, typing)
+               for color, typing in zip(_COLORS, _TYPINGS))
+_ANSI_COLORS = {"white": 37, "red": 31, "yellow": 33}
+ANSI = tuple("\x1b[1;{}m{}\x1b[0m|".format(_ANSI_COLORS[color], typing)
+             for color, typing in zip(_COLORS, _TYPINGS))
+
+# steps of a human turn in TUI.play
+SELECT_PIECE, SELECT_OPTION, APPLY = range(3)
+
 class TUI:
-    def __init__(self, nplayers, nrows):
-        self.game = CheckersGame(nrows)
+    def __init__(self, nplayers, nrows, ai = 0, think_time = 1.0, book = None,
+                 render = "full", input_source = input, engine = "search",
+                 draw_plies = DRAW_PLIES, repetitions = REPETITIONS):
+        """
+        Constructor
+
+        Args:
+            nplayers (int): number of players
+            nrows (int): number of rows of pieces per player
+            ai (int): number of the player the computer plays, 0 for none
+            think_time (float): seconds the computer may think per move
+            book (None or str): opening book file the computer plays from
+            render (str): "full" clears and reprints the screen every turn,
+            "diff" keeps the board on screen and redraws changed squares only
+            input_source (callable): returns the next line typed by the
+            players and raises EOFError when there is none, see script_input
+            engine (str): "search" for alpha-beta or "mcts" for Monte Carlo
+            tree search, which copes better with the branching of large
+            boards
+            draw_plies (int): plies without a capture or a man moving that
+            draw the game, 0 for no limit
+            repetitions (int): times a position may be reached before the
+            game is drawn, 0 to never draw by repetition
+        """
+        self.game = CheckersGame(nrows, draw_plies, repetitions)
         self.nplayers = nplayers
         self.active = True
         self.end_turn_options = {"winner": self._winner, "draw": self._draw}
+        self.ai = ai
+        self.think_time = think_time
+        self.engine = None
+        if ai and engine == "mcts":
+            self.engine = MCTSEngine(workers = 0, book = OpeningBook(book)
+                                     if book else None)
+        elif ai:
+            self.engine = SearchEngine(book = OpeningBook(book) if book
+                                       else None)
+        self.last_ai_move = None
+        self.renderer = DiffRenderer() if render == "diff" else None
+        self.input_source = input_source
 
-    def repr_board(self):
+    def repr_board(self, player = None):
         """
         Prints out a colored string representation of the game board for the 
-        user
-        """
-        cols = "  "
-        for i, _ in enumerate(self.game.board.board): 
-            if i < 9:
-                cols = cols + str(i + 1) + " "
-            elif i < 99:
-                cols = cols + str(i + 1)
-            else:
-                break
-        print(cols)
-
-        for i, row in enumerate(self.game.board.board):
-            if i < 26:
-                row_str = chr(i + 65) + " "
-            elif i >= 26:
-                row_str = chr(floor((i - 26) / 26) + 65) + chr(i % 26 + 65)
-            elif i >= 99:
-                row_str = "  "
-
-            for spot in row:
-                if isinstance(spot, CheckerPiece):
-                    if spot.king:
-                        typing = "K"
-                    else:
-                        typing = "0"
-                    if spot.player == self.game.board.player1:
-                        color = "red"
-                    else:
-                        color = "yellow"
-                else:
-                    typing = "0"
-                    color = "white"
-                icon = "[bold {}]{}[/bold {}]|".format(color,typing,color)
-                row_str = row_str + icon
-            print(row_str)
+        user, seen by a player (the current player by default)
+        """
+        if player is None:
+            player = self.game.get_curr_player()
+        print(col_header(self.game.board.bits.ncols))
+
+        for i, row in enumerate(board_codes(self.game, player)):
+            print(row_label(i) + "".join(MARKUP[code] for code in row))
+
+    def _show_board(self, player = None):
+        """
+        Brings the board seen by a player to the top of the screen, leaving
+        the cursor below it for the status lines
+        """
+        if self.renderer is None:
+            clear()
+            self.repr_board(player)
+        else:
+            self.renderer.draw(self.game, player or
+                               self.game.get_curr_player())
 
     def play(self, error = None):
         """
         Primary Function of the TUI, Displays all important information to user
-        to properly play the Checkers Game
+        to properly play the Checkers Game. Each human turn steps through
+        selecting a piece, selecting one of its options and applying it, going
+        back to selecting a piece after invalid input.
         
         Input:
-            error (None or int): intended to print what went wrong following
-            clearing the console
+            error (None or str): what went wrong, printed after clearing the
+            console
             
         Returns: None
         """
+        state = SELECT_PIECE
         while self.active:
+            if self.game.get_curr_player().player_num == self.ai:
+                self._play_ai_turn()
+                state = SELECT_PIECE
+                continue
+            if state == SELECT_PIECE:
+                self._show_turn(error)
+                turn_choice = self._read()
+                if turn_choice == "resign":
+                    self._quit()
+                try:
+                    board_loc = self.game.tuple_loc(turn_choice)
+                    self.game.board.check_loc(board_loc,
+                                              self.game.get_curr_player())
+                    self.game.board.check_for_piece(board_loc)
+                    possible_moves = self._display_possible_moves(board_loc)
+                    nmoves = len(possible_moves)
+                    possible_jumps = self._display_possible_jumps(board_loc,
+                                                                  nmoves)
+                    noptions = nmoves + len(possible_jumps)
+                    state = SELECT_OPTION
+                except Exception:
+                    error = "invalid move, please select another piece"
+            elif state == SELECT_OPTION:
+                print("Please select one of the options")
+                try:
+                    choice = int(self._read())
+                    if choice < 1 or choice > noptions:
+                        raise Exception("Invalid move choice")
+                    state = APPLY
+                except Exception:
+                    error = "invalid choice, please select from 1 to {}" \
+                            .format(noptions)
+                    state = SELECT_PIECE
+            else:
+                end_loc = self.game.complete_turn(choice, board_loc,
+                possible_moves, possible_jumps)
+                error = None
+                state = SELECT_PIECE
+                end = self.game.end_turn(end_loc)
+                if end:
+                    self.end_turn_options[end]()
+
+    def _show_turn(self, error):
+        """
+        Shows the board, the last computer move, what went wrong with the
+        previous input and the prompt for a piece
+        """
+        if self.renderer is None:
             clear()
-            if error == 1:
-                print("invalid move, please select another piece")
-            elif error:
-                print("invalid choice, please select from 1 to {}".format(error))
+        else:
+            self.renderer.draw(self.game, self.game.get_curr_player())
+        if self.last_ai_move:
+            print(self.last_ai_move)
+        if error:
+            print(error)
 
+        if self.renderer is None:
             self.repr_board()
-            print("The current turn is {}".format(self.game.turn))
-            print("The current player is {}".format(self.game.get_curr_player()))
-
-            print("What piece location would you like to move")
-            print("(You can also type resign to quit the game)")
-            turn_choice = input()
-            if turn_choice == "resign":
-                self._quit()
-            try:
-                board_loc = self.game.tuple_loc(turn_choice)
-                self.game.board.check_loc(board_loc, self.game.get_curr_player())
-                self.game.board.check_for_piece(board_loc)
-                possible_moves = self._display_possible_moves(board_loc)
-                nmoves = len(possible_moves)
-                possible_jumps = self._display_possible_jumps(board_loc, nmoves)
-                noptions = nmoves + len(possible_jumps)
-            except:
-                self.play(1)
-
-            print("Please select one of the options")
-            try:
-                choice = int(input())
-                if choice > noptions:
-                    raise Exception("Invalid move choice")
-            except:
-                self.play(noptions)
-            end_loc = self.game.complete_turn(choice, board_loc, 
-            possible_moves, possible_jumps)
-
-            end = self.game.end_turn(end_loc)
-            if end:
-                self.end_turn_options[end]()
+        # one print call, rich renders every call separately
+        print("The current turn is {}\n".format(self.game.turn) +
+              "The current player is {}\n".format(self.game.get_curr_player()) +
+              "What piece location would you like to move\n" +
+              "(You can also type resign to quit the game)")
+
+    def _read(self):
+        """
+        Reads the next line of input, quitting once the input runs out
+
+        Returns: str
+        """
+        try:
+            return self.input_source()
+        except EOFError:
+            self._quit()
+
+    def _play_ai_turn(self):
+        """
+        Lets the computer search for and play its move
+        """
+        self._show_board()
+        print("{} is thinking...".format(self.game.get_curr_player()))
+        move = self.engine.search(self.game, self.think_time)
+        end = self.game.play_move(move)
+        # described from the view of the player who moves next
+        self.last_ai_move = "{} played {}".format(self.game.get_other_player(),
+        self.game.describe_move(move))
+        if end:
+            self.end_turn_options[end]()
 
     def _display_possible_moves(self, loc):
         """
@@ -133,14 +224,9 @@ class TUI:
         possible_jumps = self.game.get_possible_jumps(loc)
         for jump in possible_jumps:
             i += 1
-            if isinstance(jump, list) and len(jump) > 1:
-                output = str(i) + ". jump to " + self.game.de_tuple_loc(jump[0])
-                for val in jump[1:-1]:
-                    output = output + " to " + self.game.de_tuple_loc(val)
-                print(output)
-            else:
-                jump = self.game.de_tuple_loc(jump)
-                print(str(i) + ". jump to " + jump)
+            landings = [self.game.de_tuple_loc(self.game.board.bits.loc(sq))
+                        for sq in jump.path[1:]]
+            print(str(i) + ". jump to " + " to ".join(landings))
         return possible_jumps
 
     def _draw(self):
@@ -168,12 +254,153 @@ class TUI:
         quit()
 
 class OnlineTUI(TUI):
-    def __init__(self, nrows):
-        raise NotImplementedError("OnlineTUI has not been implemented")
+    def __init__(self, nrows, host, port, game_id = None, render = "full",
+                 input_source = input):
+        """
+        Constructor. Connects to a game server and waits for an opponent,
+        who then plays through the server in place of the computer.
+
+        Args:
+            nrows (int): number of rows of pieces per player
+            host (str): address of the game server
+            port (int): port of the game server
+            game_id (None or int): open game to join, matched if None
+            render (str): "full" or "diff", see TUI
+            input_source (callable): source of the player's input, see TUI
+        """
+        super(OnlineTUI, self).__init__(2, nrows, render = render,
+                                        input_source = input_source)
+        print("Waiting for an opponent...")
+        self.game = OnlineCheckersGame({"host": host, "port": port,
+                                        "nrows": nrows, "game": game_id})
+        self.ai = 3 - self.game.player_num
+        self.end_turn_options["left"] = self._opponent_left
+
+    def _play_ai_turn(self):
+        """
+        Waits for the remote player's move
+        """
+        self._show_board(self.game.get_other_player())
+        print("Waiting for {} to move...".format(self.game.get_curr_player()))
+        move = self.game.wait_for_move()
+        if move is None:
+            self._opponent_left()
+        end = self.game.play_move(move)
+        self.last_ai_move = "{} played {}".format(self.game.get_other_player(),
+        self.game.describe_move(move))
+        if end:
+            self.end_turn_options[end]()
+
+    def _opponent_left(self):
+        """
+        Ends the game when the remote player, whose turn it is, resigned or
+        disconnected
+        """
+        print("{} left the game, you win!".format(self.game.get_curr_player()))
+        self.active = False
+        quit()
+
+    def _quit(self):
+        self.game.resign()
+        super(OnlineTUI, self)._quit()
         
 def clear():
     if os.name == 'nt':
         _ = os.system('cls')
     else:
         _ = os.system('clear')
-        
\ No newline at end of file
+        
+def script_input(f):
+    """
+    Makes an input source reading the players' input from a file, one
+    answer per line, to replay or test a session without typing it
+
+    Input:
+        f (file): open text file
+
+    Returns: callable
+    """
+    lines = iter(f)
+    def read():
+        for line in lines:
+            return line.rstrip("\n")
+        raise EOFError
+    return read
+
+def board_codes(game, player):
+    """
+    Square codes of the board as seen by a player, read from the bitboard
+
+    Input:
+        game (CheckersGame): game to render
+        player (Player): player looking at the board
+
+    Returns: list[list[int]]
+    """
+    bits = game.board.bits
+    codes = [[EMPTY] * bits.ncols for _ in range(bits.nrows)]
+    for player_num, man in ((1, P1_MAN), (2, P2_MAN)):
+        for sq in iter_bits(bits.pieces(player_num)):
+            r, c = bits.loc(sq)
+            codes[r][c] = man + bits.is_king(sq)
+    if player.player_num == 2:
+        codes = [row[::-1] for row in codes[::-1]]
+    return codes
+
+def col_header(ncols):
+    return "  " + "".join(str(i + 1) + " " if i < 9 else str(i + 1)
+                          for i in range(min(ncols, 99)))
+
+def row_label(i):
+    if i < 26:
+        return chr(i + 65) + " "
+    return chr(floor((i - 26) / 26) + 65) + chr(i % 26 + 65)
+
+class DiffRenderer:
+    """
+    Draws the board with ANSI cursor positioning. The first frame clears the
+    screen; after that only squares whose piece changed are rewritten, then
+    everything below the board is cleared for the status lines. A frame that
+    would not fit the terminal is redrawn whole, since scrolling would move
+    the board away from the positions the diff writes to.
+    """
+    # lines below the board used by prompts and move options
+    STATUS_LINES = 12
+
+    def __init__(self, out = None):
+        self.out = out or sys.stdout
+        self.cells = None
+
+    def draw(self, game, player):
+        """
+        Brings the screen up to date with a player's view of the board
+
+        Input:
+            game (CheckersGame): game to render
+            player (Player): player looking at the board
+
+        Returns: None
+        """
+        codes = board_codes(game, player)
+        nrows = len(codes)
+        height = shutil.get_terminal_size().lines
+        parts = []
+        if (self.cells is None or len(self.cells) != nrows or
+            nrows + 1 + self.STATUS_LINES > height):
+            parts.append("\x1b[2J\x1b[H")
+            parts.append(col_header(len(codes[0])) + "\n")
+            for i, row in enumerate(codes):
+                parts.append(row_label(i) + "".join(ANSI[code] for code in row)
+                             + "\n")
+        else:
+            for i, (row, old) in enumerate(zip(codes, self.cells)):
+                for j, code in enumerate(row):
+                    if code != old[j]:
+                        # rows and columns are 1-based, below the header line
+                        # and right of the row label
+                        parts.append("\x1b[{};{}H".format(i + 2, 2 * j + 3))
+                        parts.append(ANSI[code])
+        parts.append("\x1b[{};1H\x1b[J".format(nrows + 2))
+        self.out.write("".join(parts))
+        self.out.flush()
+        self.cells = codes